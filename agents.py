@@ -1,12 +1,12 @@
+import copy
 import random
 import numpy as np
 import heapq
-from collections import defaultdict
 
 import math
-from scipy.spatial.distance import cityblock
 
 from agent import Agent
+from qtable import DenseQTable, QTable, SharedQTable
 
 N_ACTIONS = 4
 DOWN, UP, RIGHT, LEFT = range(N_ACTIONS)
@@ -445,25 +445,24 @@ class IntentionCommunicationAgent(Agent):
         
 class QLearning(Agent):
 
-    def __init__(self, n_actions, learning_rate=0.3, discount_factor=0.3, exploration_rate=0.15, initial_q_values=0.0):
-        self._Q = defaultdict(lambda: np.ones(n_actions) * initial_q_values)
+    def __init__(self, n_actions, learning_rate=0.3, discount_factor=0.3, exploration_rate=0.15, initial_q_values=0.0, q_table=None, replay=None, batch_size=32, n_states=None):
+        if q_table is None:
+            # Encoded observations (see encoders.py) index a dense table directly
+            q_table = QTable(n_actions, initial_q_values) if n_states is None else DenseQTable(n_actions, n_states, initial_q_values)
+        self._Q = q_table
+        self._n_states = n_states
+        self._replay = replay
+        self._batch_size = batch_size
         self._learning_rate = learning_rate
         self._discount_factor = discount_factor
         self._exploration_rate = exploration_rate
         self._n_actions = n_actions
+        self.checkpoint_info = {}
         super(QLearning, self).__init__("Q-Learning")
 
     def action(self, explore=True):
 
-        x = tuple()
-
-        for i in self.observation[0][0]:
-            if len(i) == 1:
-                x += tuple(i[0])
-            else:
-                x += tuple(i)
-        for i in self.observation[0][1]:
-            x += tuple(i)
+        x = self._state_key(self.observation)
 
         q_values = self._Q[x]
 
@@ -478,29 +477,207 @@ class QLearning(Agent):
 
     def next(self, observation, action, next_observation, reward, terminal, info):
 
-        a, r =action, reward
+        x = self._Q.row(self._state_key(observation))
+        y = self._Q.row(self._state_key(next_observation))
+
+        self._update(x, action, reward, y, terminal)
+
+        if self._replay is not None:
+            self._replay.add(x, action, reward, y, terminal)
+            if len(self._replay) >= self._batch_size:
+                indices, batch = self._replay.sample(self._batch_size)
+                td_errors = self.update_batch(
+                    batch["state"], batch["action"], batch["reward"], batch["next_state"], batch["done"])
+                self._replay.update_priorities(indices, td_errors)
+
+    def _update(self, x, a, r, y, terminal):
+        """
+        Applies the Q-learning update to row `x` of the Q-table and returns the TD error.
+        """
         alpha, gamma = self._learning_rate, self._discount_factor
 
+        Q_x, Q_y = self._Q.values[x], self._Q.values[y]
+        max_Q_ya = 0.0 if terminal else max(Q_y)
+
+        td_error = r + gamma * max_Q_ya - Q_x[a]
+        Q_x[a] = Q_x[a] + alpha * td_error
+        return td_error
+
+    def update_batch(self, x, a, r, y, terminal):
+        """
+        Applies the Q-learning update to a minibatch of transitions, given as arrays of Q-table rows,
+        actions, rewards, next rows and terminal flags. Returns the TD error of each transition.
+
+        All TD targets are computed from the Q-values before the update and applied with a single
+        scatter-add. A state-action pair that appears k times receives the mean of its k TD errors
+        (each occurrence adds td_error / k), so duplicates do not multiply the learning rate.
+        """
+        alpha, gamma = self._learning_rate, self._discount_factor
+        Q = self._Q.values
+
+        max_Q_y = np.where(terminal, 0.0, Q[y].max(axis=1))
+        td_errors = r + gamma * max_Q_y - Q[x, a]
+
+        _, inverse, counts = np.unique(x * self._n_actions + a, return_inverse=True, return_counts=True)
+        np.add.at(Q, (x, a), alpha * td_errors / counts[inverse])
+        return td_errors
+
+    def snapshot(self):
+        """
+        Returns a frozen copy of the agent for evaluation: a copy of the Q-table, no replay buffer and
+        training disabled. Shared-memory tables are not copied, so their snapshots keep learning.
+        """
+        snapshot = copy.copy(self)
+        snapshot._Q = self._Q if isinstance(self._Q, SharedQTable) else copy.deepcopy(self._Q)
+        snapshot._replay = None
+        snapshot.eval()
+        return snapshot
+
+    # ########### #
+    # Checkpoints #
+    # ########### #
+
+    def checkpoint(self, path, **info):
+        """
+        Saves the Q-table and the hyperparameters to the checkpoint directory `path`.
+        Extra keyword arguments (e.g. training progress) are stored alongside them.
+        """
+        self._Q.checkpoint(path, meta={
+            "learning_rate": self._learning_rate,
+            "discount_factor": self._discount_factor,
+            "exploration_rate": self._exploration_rate,
+            **info
+        })
+
+    @classmethod
+    def from_checkpoint(cls, path, **kwargs):
+        """
+        Resumes an agent from a checkpoint directory, memory-mapping its Q-table.
+        The extra information saved with the checkpoint is available in `checkpoint_info`.
+        Keyword arguments are passed on to the constructor (e.g. a replay buffer).
+        """
+        table = QTable.load(path)
+        agent = cls(
+            *cls._checkpoint_args(table),
+            n_states=table.n_rows if isinstance(table, DenseQTable) else None,
+            learning_rate=table.meta["learning_rate"],
+            discount_factor=table.meta["discount_factor"],
+            exploration_rate=table.meta["exploration_rate"],
+            initial_q_values=table.initial_q_values,
+            q_table=table,
+            **kwargs
+        )
+        agent.checkpoint_info = table.meta
+        return agent
+
+    @staticmethod
+    def _checkpoint_args(table):
+        """Positional constructor arguments of an agent resumed from `table`."""
+        return (table.n_actions,)
+
+    # ############### #
+    # Private Methods #
+    # ############### #
+
+    def _state_key(self, observation):
+        if self._n_states is not None:
+            return observation
+        if isinstance(observation, np.ndarray):
+            return tuple(observation.tolist())
         x = tuple()
-        for i in self.observation[0][0]:
+        for i in observation[0][0]:
             if len(i) == 1:
                 x += tuple(i[0])
             else:
                 x += tuple(i)
-        for i in self.observation[0][1]:
+        for i in observation[0][1]:
             x += tuple(i)
-        
-        y = tuple()
-        for i in self.observation[0][0]:
-            if len(i) == 1:
-                y += tuple(i[0])
-            else:
-                y += tuple(i)
-        for i in self.observation[0][1]:
-            y += tuple(i)
+        return x
+
+
+class FactorizedQLearning(QLearning):
+
+    """
+    Multi-agent Q-learning with one Q-function per agent instead of one over the joint actions.
+
+    Takes the same (shared) observations and returns the same joint action indices as QLearning, so it
+    runs on a JointActionWrapper unchanged, but the Q-table holds sum(action_counts) columns per state
+    instead of prod(action_counts): the columns of each agent are a slice of one table, which shares
+    the state index and supports the same replay, checkpoints and shared-memory tables.
+
+    Modes
+    -----
+    independent
+        Each agent learns its own Q_i(x, a_i) from the shared reward, treating the others as part of
+        the environment.
+    vdn
+        Value decomposition: the joint value is Q(x, a) = sum_i Q_i(x, a_i), and every component is
+        updated with the TD error of the sum.
+
+    In both modes the greedy joint action is the combination of the per-agent greedy actions.
+    """
+
+    MODES = ("independent", "vdn")
+
+    def __init__(self, action_counts, mode="independent", **kwargs):
+        assert mode in self.MODES, f"Unknown factorization mode {mode}"
+        self._action_counts = tuple(action_counts)
+        self._offsets = np.cumsum((0,) + self._action_counts)
+        self._mode = mode
+        super(FactorizedQLearning, self).__init__(int(self._offsets[-1]), **kwargs)
+        self.name = f"Factorized Q-Learning ({mode})"
+
+    def action(self, explore=True):
+
+        x = self._state_key(self.observation)
+        q_values = self._Q[x]
+
+        if not self.training or (self.training and np.random.uniform(0, 1) > self._exploration_rate):
+            # Exploit
+            actions = [
+                np.random.choice(np.flatnonzero(agent_q_values == np.max(agent_q_values)))
+                for agent_q_values in np.split(q_values, self._offsets[1:-1])
+            ]
+        else:
+            # Explore
+            actions = [np.random.randint(n_actions) for n_actions in self._action_counts]
+
+        return int(np.ravel_multi_index(actions, self._action_counts))
+
+    def _update(self, x, a, r, y, terminal):
+        return self.update_batch(np.array([x]), np.array([a]), np.array([r]), np.array([y]), np.array([terminal]))[0]
+
+    def update_batch(self, x, a, r, y, terminal):
+        """
+        Applies the factorized update to a minibatch of transitions with joint actions `a`.
+        Returns one TD error per transition (the largest per-agent one in independent mode).
+        """
+        alpha, gamma = self._learning_rate, self._discount_factor
+        Q = self._Q.values
+
+        # (B, N) columns of each agent's action in the table
+        columns = np.stack(np.unravel_index(a, self._action_counts), axis=1) + self._offsets[:-1]
+        rows = np.broadcast_to(x[:, None], columns.shape)
+
+        Q_xa = Q[rows, columns]
+        max_Q_y = np.maximum.reduceat(Q[y], self._offsets[:-1], axis=1)
+        bootstrap = np.where(terminal, 0.0, gamma)[:, None]
+
+        if self._mode == "independent":
+            td_errors = r[:, None] + bootstrap * max_Q_y - Q_xa
+        else:
+            td_errors = r[:, None] + bootstrap * max_Q_y.sum(axis=1, keepdims=True) - Q_xa.sum(axis=1, keepdims=True)
+            td_errors = np.broadcast_to(td_errors, columns.shape)
+
+        # Duplicate (state, column) pairs share the mean of their TD errors, as in QLearning.update_batch
+        _, inverse, counts = np.unique(rows * Q.shape[1] + columns, return_inverse=True, return_counts=True)
+        np.add.at(Q, (rows, columns), alpha * td_errors / counts[inverse].reshape(columns.shape))
 
+        return td_errors[np.arange(len(td_errors)), np.abs(td_errors).argmax(axis=1)]
 
-        Q_xa, Q_y = self._Q[x][a], self._Q[y]
-        max_Q_ya = max(Q_y)
+    def checkpoint(self, path, **info):
+        super(FactorizedQLearning, self).checkpoint(path, action_counts=self._action_counts, mode=self._mode, **info)
 
-        self._Q[x][a] = self._Q[x][a] +  alpha * (r + gamma * max_Q_ya - self._Q[x][a])
\ No newline at end of file
+    @staticmethod
+    def _checkpoint_args(table):
+        return (table.meta["action_counts"], table.meta["mode"])
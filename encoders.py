@@ -0,0 +1,63 @@
+import numpy as np
+
+# Moves in the order of the agents' actions (see Agent.move_direction)
+MOVES = np.array([[0, -1], [0, 1], [1, 0], [-1, 0]])
+
+
+class RelativeFeatureEncoder:
+
+    """
+    Encodes the positions observed in the 2-snake game into a small, board-independent state index.
+
+    For each snake the state keeps
+        - the direction of its food, as the signs of the x and y distances (9 values),
+        - one danger bit per move, set if the move would hit a wall or a snake block (16 values),
+    plus the direction of the second snake's head as seen from the first one (9 values).
+
+    The joint state therefore takes one of (9 * 16) ** 2 * 9 = 186624 values on any board size,
+    which lets QLearning use a dense, preallocated Q-table (see DenseQTable).
+
+    Observations are the positions returned by the game, [snakes_positions, food_positions], with
+    each snake given as a list of [x, y] blocks starting at the head, or the flat array of head and
+    food positions returned by SnakeEnv (in which case only the heads count as obstacles).
+    """
+
+    N_SNAKE_STATES = 9 * 16
+
+    def __init__(self, width, height, unit_size):
+        self.width = width
+        self.height = height
+        self.unit_size = unit_size
+        self.n_states = self.N_SNAKE_STATES ** 2 * 9
+
+    def __call__(self, observation):
+        return self.encode(observation)
+
+    def encode(self, observation):
+        if isinstance(observation, np.ndarray):
+            positions = observation.reshape(-1, 2)
+            heads, foods = positions[:len(positions) // 2], positions[len(positions) // 2:]
+            occupied = {tuple(head) for head in heads.tolist()}
+        else:
+            snakes, foods = observation[0], observation[1]
+            heads = np.array([snake[0] for snake in snakes])
+            occupied = {tuple(block) for snake in snakes for block in snake}
+
+        state = 0
+        for head, food in zip(heads, foods):
+            state = state * self.N_SNAKE_STATES + self._snake_state(head, food, occupied)
+        return state * 9 + self._direction(heads[1] - heads[0])
+
+    def _snake_state(self, head, food, occupied):
+        danger = 0
+        for move in MOVES:
+            x, y = head + move * self.unit_size
+            hit_wall = x <= 0 or y <= 0 or x + self.unit_size >= self.width or y + self.unit_size >= self.height
+            danger = danger * 2 + int(hit_wall or (x, y) in occupied)
+        return self._direction(np.asarray(food) - head) * 16 + danger
+
+    @staticmethod
+    def _direction(distances):
+        """Maps the signs of an (x, y) distance to one of 9 values."""
+        sign_x, sign_y = np.sign(distances).astype(int)
+        return (sign_x + 1) * 3 + (sign_y + 1)
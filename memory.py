@@ -0,0 +1,89 @@
+import tracemalloc
+
+import numpy as np
+
+
+class MemoryMonitor:
+
+    """
+    Tracks memory use and canvas items at episode boundaries to detect leaks.
+
+    While enabled, tracemalloc traces every Python allocation (which slows the run down, so the monitor is
+    opt-in). At the end of each episode the monitor records the traced memory and the number of items on the
+    given canvases, which should live across episodes (e.g. the canvas of a viewer or of a reused game
+    window): items cannot pile up on a canvas destroyed with its episode. Growth per episode is the slope
+    of a least-squares line through those records, ignoring the first `warmup` episodes (imports, caches
+    and the first window are allocated there).
+
+    Parameters
+    ----------
+    max_bytes_per_episode: float
+        Largest acceptable growth of the traced memory per episode.
+    max_items_per_episode: float
+        Largest acceptable growth of the number of canvas items per episode.
+    warmup: int
+        Number of initial episodes left out of the growth estimates.
+    n_frames: int
+        Depth of the tracebacks stored for each allocation.
+    """
+
+    def __init__(self, max_bytes_per_episode=64 * 1024, max_items_per_episode=0.5, warmup=3, n_frames=1):
+        self.max_bytes_per_episode = max_bytes_per_episode
+        self.max_items_per_episode = max_items_per_episode
+        self.warmup = warmup
+        self.n_frames = n_frames
+        self.memory = []
+        self.canvas_items = []
+        self._first_snapshot = None
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.n_frames)
+
+    def stop(self):
+        tracemalloc.stop()
+
+    def episode_end(self, canvases=()):
+        """Records the traced memory and the number of items on the given canvases after an episode."""
+        self.memory.append(tracemalloc.get_traced_memory()[0])
+        self.canvas_items.append(sum(len(canvas.find_all()) for canvas in canvases if canvas is not None))
+        if len(self.memory) == self.warmup + 1:
+            self._first_snapshot = tracemalloc.take_snapshot()
+
+    def growth(self, values):
+        """Returns the growth per episode of the given records, past the warmup."""
+        values = np.asarray(values[self.warmup:], dtype=np.float64)
+        if len(values) < 2:
+            return 0.0
+        return float(np.polyfit(np.arange(len(values)), values, 1)[0])
+
+    @property
+    def bytes_per_episode(self):
+        return self.growth(self.memory)
+
+    @property
+    def items_per_episode(self):
+        return self.growth(self.canvas_items)
+
+    @property
+    def leaking(self):
+        return self.bytes_per_episode > self.max_bytes_per_episode or self.items_per_episode > self.max_items_per_episode
+
+    def report(self, n_top=10):
+        """Prints the growth per episode and the source lines whose allocations grew the most since the warmup.
+        Returns False if the growth exceeds the thresholds."""
+        print(f"[memory] {len(self.memory)} episodes, traced memory {self.memory[-1] / 2 ** 20:.1f} MiB, "
+              f"{self.canvas_items[-1]} canvas items after the last episode" if self.memory else "[memory] no episodes")
+        print(f"[memory] growth per episode: {self.bytes_per_episode / 1024:.1f} KiB "
+              f"(max {self.max_bytes_per_episode / 1024:.1f}), {self.items_per_episode:.2f} canvas items "
+              f"(max {self.max_items_per_episode})")
+
+        if self._first_snapshot is not None:
+            differences = tracemalloc.take_snapshot().compare_to(self._first_snapshot, "lineno")
+            for difference in differences[:n_top]:
+                if difference.size_diff > 0:
+                    print(f"[memory]     {difference}")
+
+        if self.leaking:
+            print("[memory] FAILED: growth per episode exceeds the threshold")
+        return not self.leaking
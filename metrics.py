@@ -0,0 +1,140 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "snake_"
+
+
+class Metrics:
+
+    """
+    Live metrics of a run, served on localhost in the Prometheus text exposition format.
+
+    The game loop only increments counters and sums under a lock, which takes microseconds and never waits
+    on the network: the HTTP server runs in a daemon thread and renders the current values when scraped.
+
+    Exposed metrics
+    ---------------
+    snake_steps_total
+        Steps played (their rate is rate(snake_steps_total[1m]) in PromQL, which unlike a rate computed at
+        scrape time does not depend on how many clients scrape the server).
+    snake_episodes_total{team}
+        Episodes completed by each team.
+    snake_step_phase_seconds_sum{phase}, snake_step_phase_seconds_count{phase}
+        Time spent in each phase of a step (divide the sum by the count for the mean latency).
+    snake_queue_depth
+        Number of items waiting in the queue between workers and the main process, in parallel mode.
+    snake_memory_rss_bytes
+        Resident memory of the main process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps = 0
+        self._episodes = {}
+        self._phases = {}
+        self._queue_depth = 0
+        self._server = None
+
+    # ####### #
+    # Updates #
+    # ####### #
+
+    def step(self, phase_durations=()):
+        """Counts a step, given as an iterable of (phase, seconds)."""
+        with self._lock:
+            self._steps += 1
+            for phase, seconds in phase_durations:
+                total, count = self._phases.get(phase, (0.0, 0))
+                self._phases[phase] = (total + seconds, count + 1)
+
+    def step_totals(self):
+        """Returns the number of steps and the (seconds, count) of each phase, e.g. to send them to another process."""
+        with self._lock:
+            return self._steps, dict(self._phases)
+
+    def add_steps(self, steps, phases):
+        """Adds step totals counted elsewhere (see step_totals), e.g. by a worker process."""
+        with self._lock:
+            self._steps += steps
+            for phase, (seconds, count) in phases.items():
+                total, n = self._phases.get(phase, (0.0, 0))
+                self._phases[phase] = (total + seconds, n + count)
+
+    def episode(self, team):
+        with self._lock:
+            self._episodes[team] = self._episodes.get(team, 0) + 1
+
+    def queue_depth(self, depth):
+        self._queue_depth = depth
+
+    # ######## #
+    # Exporter #
+    # ######## #
+
+    def render(self):
+        """Returns the current values in the Prometheus text format."""
+        with self._lock:
+            steps = self._steps
+            episodes = dict(self._episodes)
+            phases = dict(self._phases)
+
+        lines = []
+        self._metric(lines, "steps_total", "counter", "Steps played.", [("", steps)])
+        self._metric(lines, "episodes_total", "counter", "Episodes completed per team.",
+                     [(f'{{team="{team}"}}', count) for team, count in episodes.items()])
+        self._metric(lines, "step_phase_seconds", "summary", "Time spent in each phase of a step.",
+                     [(f'_sum{{phase="{phase}"}}', total) for phase, (total, _) in phases.items()]
+                     + [(f'_count{{phase="{phase}"}}', count) for phase, (_, count) in phases.items()])
+        self._metric(lines, "queue_depth", "gauge", "Items waiting in the worker queue.", [("", self._queue_depth)])
+        self._metric(lines, "memory_rss_bytes", "gauge", "Resident memory of the main process.", [("", memory_rss())])
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _metric(lines, name, kind, description, samples):
+        lines.append(f"# HELP {PREFIX}{name} {description}")
+        lines.append(f"# TYPE {PREFIX}{name} {kind}")
+        lines.extend(f"{PREFIX}{name}{labels} {value}" for labels, value in samples)
+
+    def serve(self, port, host="127.0.0.1"):
+        """Starts serving the metrics on http://host:port/metrics from a daemon thread."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        return self._server.server_address
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def memory_rss():
+    """Returns the resident memory of this process in bytes (the peak on systems without /proc)."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,339 @@
+import json
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+VALUES_FILE = "q_values.{}.npy"
+STATES_FILE = "states.{}.npy"
+META_FILE = "meta.json"
+
+
+class QTable:
+
+    """
+    Growable Q-value table keyed by hashable states.
+
+    The Q-values of every visited state live in a single contiguous (rows x n_actions) array and a
+    dictionary maps each state to its row. Unlike a defaultdict with a lambda factory, the table can be
+    pickled and written to disk as plain .npy files that are memory-mapped back on resume.
+
+    Attributes
+    ----------
+    n_actions: int
+        Number of actions (columns) per state.
+
+    values: np.ndarray
+        The (capacity x n_actions) Q-value array. Only the first n_rows rows are in use.
+
+    states: np.ndarray
+        The (capacity x key_len) integer array holding the state key of each row.
+
+    n_rows: int
+        Number of states inserted so far.
+
+    meta: dict
+        Extra information stored alongside the table in checkpoints (e.g. hyperparameters).
+    """
+
+    def __init__(self, n_actions, initial_q_values=0.0, capacity=1024):
+        self.n_actions = n_actions
+        self.initial_q_values = initial_q_values
+        self.values = np.full((capacity, n_actions), initial_q_values, dtype=np.float64)
+        self.states = None
+        self.n_rows = 0
+        self.meta = {}
+        self._index = {}
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, state):
+        return state in self.index
+
+    def __getitem__(self, state):
+        row = self.row(state)
+        return self.values[row]
+
+    def __getstate__(self):
+        # Memory-mapped arrays are copied so that pickles never refer to the checkpoint files. At least one
+        # row is kept, as an empty table could never grow back (_grow doubles the capacity)
+        state = self.__dict__.copy()
+        rows = max(self.n_rows, 1)
+        state["values"] = np.array(self.values[:rows])
+        state["states"] = None if self.states is None else np.array(self.states[:rows])
+        state["_index"] = self.index
+        return state
+
+    @property
+    def index(self):
+        """Maps each state key to its row, rebuilt on first use after a resume."""
+        if self._index is None:
+            self._index = {tuple(state): row for row, state in enumerate(self.states[:self.n_rows].tolist())}
+        return self._index
+
+    def row(self, state):
+        """Returns the row of the given state, inserting it with the initial Q-values if unseen."""
+        row = self.index.get(state)
+        if row is None:
+            row = self._insert(state)
+        return row
+
+    def rows(self, states):
+        """Returns the rows of a sequence of states as an integer array."""
+        return np.fromiter((self.row(state) for state in states), dtype=np.int64, count=len(states))
+
+    def _insert(self, state):
+        if self.states is None:
+            self.states = np.zeros((len(self.values), len(state)), dtype=np.int64)
+        if self.n_rows == len(self.values):
+            self._grow()
+        row = self.n_rows
+        # The row may hold stale values, e.g. of states inserted after the checkpoint a table was resumed from
+        self.values[row] = self.initial_q_values
+        self.states[row] = state
+        self.index[state] = row
+        self.n_rows += 1
+        return row
+
+    def _grow(self):
+        # Doubling keeps insertion amortized O(1)
+        capacity = 2 * len(self.values)
+        values = np.full((capacity, self.n_actions), self.initial_q_values, dtype=np.float64)
+        values[:self.n_rows] = self.values[:self.n_rows]
+        states = np.zeros((capacity, self.states.shape[1]), dtype=np.int64)
+        states[:self.n_rows] = self.states[:self.n_rows]
+        self.values, self.states = values, states
+
+    # ########### #
+    # Checkpoints #
+    # ########### #
+
+    def checkpoint(self, path, meta=None):
+        """
+        Writes a point-in-time copy of the table to the directory `path`.
+
+        The table keeps living in private memory, so the updates made after a checkpoint never reach it.
+        Every checkpoint writes its arrays to new files (numbered by generation) and then replaces the small
+        metadata file, which names them: a run preempted at any point leaves the previous checkpoint whole,
+        with arrays that match its n_rows and training progress.
+        """
+        if meta is not None:
+            self.meta.update(meta)
+        os.makedirs(path, exist_ok=True)
+
+        previous = self._read_meta(path) if self.exists(path) else {}
+        generation = previous.get("generation", 0) + 1
+        # Only the rows in use are written (at least one, so that a resumed table can grow)
+        rows = max(self.n_rows, 1)
+        files = {"values_file": VALUES_FILE.format(generation), "states_file": None}
+        self._write_array(os.path.join(path, files["values_file"]), self.values[:rows])
+        if self.states is not None:
+            files["states_file"] = STATES_FILE.format(generation)
+            self._write_array(os.path.join(path, files["states_file"]), self.states[:rows])
+
+        meta_file = os.path.join(path, META_FILE)
+        with open(meta_file + ".tmp", "w") as file:
+            json.dump({
+                "dense": isinstance(self, DenseQTable),
+                "n_rows": self.n_rows,
+                "n_actions": self.n_actions,
+                "initial_q_values": self.initial_q_values,
+                "generation": generation,
+                **files,
+                "meta": self.meta,
+            }, file)
+        os.replace(meta_file + ".tmp", meta_file)
+
+        # The arrays of the previous checkpoint are only removed once the new one is complete
+        for key in ("values_file", "states_file"):
+            if previous.get(key) and previous[key] != files[key]:
+                os.remove(os.path.join(path, previous[key]))
+
+    @staticmethod
+    def _write_array(filename, array):
+        # Written next to the target and moved in place so a preempted run never leaves a torn file
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "wb") as file:
+            np.save(file, array)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_filename, filename)
+
+    @staticmethod
+    def _read_meta(path):
+        with open(os.path.join(path, META_FILE)) as file:
+            return json.load(file)
+
+    @classmethod
+    def load(cls, path, mmap_mode="c"):
+        """
+        Resumes a table from a checkpoint directory by mapping its arrays instead of reading them.
+
+        Parameters
+        ----------
+        path: str
+            The checkpoint directory.
+        mmap_mode: str
+            Passed to np.load. The default "c" maps the arrays copy-on-write, so that the resumed table never
+            changes the checkpoint; "r" maps them read-only (e.g. for evaluation).
+        """
+        meta = cls._read_meta(path)
+
+        table_class = DenseQTable if meta.get("dense") else cls
+        table = table_class.__new__(table_class)
+        table.n_actions = meta["n_actions"]
+        table.initial_q_values = meta["initial_q_values"]
+        table.n_rows = meta["n_rows"]
+        table.meta = meta["meta"]
+        # Checkpoints written before generations were introduced have a single, unnumbered pair of files
+        values_file = meta.get("values_file", "q_values.npy")
+        states_file = meta["states_file"] if "values_file" in meta else "states.npy"
+        states_file = states_file if states_file and os.path.exists(os.path.join(path, states_file)) else None
+        table.values = np.load(os.path.join(path, values_file), mmap_mode=mmap_mode)
+        table.states = np.load(os.path.join(path, states_file), mmap_mode=mmap_mode) if states_file else None
+        table._index = None if table.states is not None else {}
+        return table
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, META_FILE))
+
+
+class DenseQTable(QTable):
+
+    """
+    Q-value table for a fixed state space of `n_states` integer states (see encoders.py).
+    The state is its own row, so there is no state index and the whole table is preallocated.
+    """
+
+    def __init__(self, n_actions, n_states, initial_q_values=0.0):
+        super(DenseQTable, self).__init__(n_actions, initial_q_values, capacity=n_states)
+        self.n_rows = n_states
+        self._index = None
+
+    def __contains__(self, state):
+        return 0 <= state < self.n_rows
+
+    @property
+    def index(self):
+        return None
+
+    def row(self, state):
+        return state
+
+    def rows(self, states):
+        return np.asarray(states, dtype=np.int64)
+
+
+class SharedQTable:
+
+    """
+    Fixed-capacity Q-value table held in multiprocessing.shared_memory, so that several worker processes
+    can learn into the same table.
+
+    States are placed by open addressing on their hash: each slot stores the 64-bit hash of its state and
+    the state itself, as `key_size` integers (1 for encoded states, the length of the observation
+    otherwise), so that two states with the same hash keep separate rows. Collisions are resolved by
+    linear probing. Claiming a free slot happens under one of `n_stripes`
+    locks (chosen by slot), while reads and Q-value updates are lock-free, in the style of Hogwild!
+    asynchronous SGD: concurrent updates to the same entry may occasionally overwrite each other, which
+    tabular Q-learning tolerates.
+
+    The table exposes the same interface as QTable (`row`, `rows`, `values`, indexing by state), and
+    pickles by name, so it can be handed to worker processes as part of an agent.
+    """
+
+    EMPTY, CLAIMED = 0, 1
+
+    def __init__(self, n_actions, capacity=2 ** 18, initial_q_values=0.0, n_stripes=64, context=None, key_size=1):
+        context = context if context is not None else multiprocessing.get_context()
+        self.n_actions = n_actions
+        self.capacity = capacity
+        self.initial_q_values = initial_q_values
+        self.key_size = key_size
+        self.meta = {}
+        self._locks = [context.Lock() for _ in range(n_stripes)]
+        size = capacity * (1 + 8 + 8 * key_size + 8 * n_actions)
+        self._memory = shared_memory.SharedMemory(create=True, size=size)
+        self._owner = True
+        self._attach()
+        self.flags[:] = self.EMPTY
+        self.values[:] = initial_q_values
+
+    def _attach(self):
+        buffer = self._memory.buf
+        capacity, n_actions, key_size = self.capacity, self.n_actions, self.key_size
+        self.flags = np.ndarray((capacity,), dtype=np.uint8, buffer=buffer)
+        self.hashes = np.ndarray((capacity,), dtype=np.int64, buffer=buffer, offset=capacity)
+        self.keys = np.ndarray((capacity, key_size), dtype=np.int64, buffer=buffer, offset=9 * capacity)
+        self.values = np.ndarray(
+            (capacity, n_actions), dtype=np.float64, buffer=buffer, offset=(9 + 8 * key_size) * capacity)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for attribute in ("flags", "hashes", "keys", "values", "_memory"):
+            del state[attribute]
+        state["_name"] = self._memory.name
+        state["_owner"] = False
+        return state
+
+    def __setstate__(self, state):
+        name = state.pop("_name")
+        self.__dict__.update(state)
+        self._memory = shared_memory.SharedMemory(name=name)
+        self._attach()
+
+    def __len__(self):
+        return int(np.count_nonzero(self.flags))
+
+    def __contains__(self, state):
+        return self._find(hash(state), self._key(state))[1]
+
+    def __getitem__(self, state):
+        return self.values[self.row(state)]
+
+    def row(self, state):
+        """Returns the slot of the given state, claiming a free one if the state is unseen."""
+        state_hash, key = hash(state), self._key(state)
+        slot, found = self._find(state_hash, key)
+        while not found:
+            with self._locks[slot % len(self._locks)]:
+                # Another worker may have claimed the slot between the probe and the lock. The flag is set
+                # last, so that lock-free readers never see a claimed slot without its key
+                if self.flags[slot] == self.EMPTY:
+                    self.hashes[slot] = state_hash
+                    self.keys[slot] = key
+                    self.flags[slot] = self.CLAIMED
+                    return slot
+            slot, found = self._find(state_hash, key)
+        return slot
+
+    def rows(self, states):
+        """Returns the slots of a sequence of states as an integer array."""
+        return np.fromiter((self.row(state) for state in states), dtype=np.int64, count=len(states))
+
+    def _key(self, state):
+        key = np.asarray(state, dtype=np.int64).reshape(-1)
+        if len(key) != self.key_size:
+            raise ValueError(f"SharedQTable states have {self.key_size} integers, got {len(key)}")
+        return key
+
+    def _find(self, state_hash, key):
+        """Probes for a state, returning its slot and True, or the first free slot and False."""
+        slot = state_hash % self.capacity
+        for _ in range(self.capacity):
+            if self.flags[slot] == self.EMPTY:
+                return slot, False
+            if self.hashes[slot] == state_hash and np.array_equal(self.keys[slot], key):
+                return slot, True
+            slot = (slot + 1) % self.capacity
+        raise MemoryError(f"SharedQTable is full ({self.capacity} states)")
+
+    def close(self):
+        """Detaches from the shared memory, releasing it if this process created it."""
+        self.flags = self.hashes = self.keys = self.values = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
@@ -0,0 +1,76 @@
+import numpy as np
+
+BACKGROUND = (0, 0, 0)
+HEAD = (255, 165, 0)
+# Colors of the snakes (and of their food), in the order of the snakes, as in the tkinter games
+COLORS = [(165, 42, 42), (0, 128, 0)]
+
+
+class BoardRasterizer:
+
+    """
+    Paints the state of the 2-snake game into an RGB frame, without tkinter.
+
+    The frame is a (height x width x 3) uint8 NumPy array allocated once and repainted in place by every
+    call, so rendering a step allocates nothing; copy the frame to keep it. Positions are the top-left
+    corners, in pixels, of unit_size x unit_size cells, as used by the games. Every cell is painted through a
+    (rows x unit_size x columns x unit_size x 3) view of the frame, with one vectorized assignment per
+    color. Cells outside of the board (e.g. a head that went through a wall) are left out.
+
+    Parameters
+    ----------
+    width: int
+        Width of the board in pixels (a multiple of unit_size).
+    height: int
+        Height of the board in pixels (a multiple of unit_size).
+    unit_size: int
+        Size of a cell in pixels.
+    scale: float
+        Number of frame pixels per board pixel, e.g. 2 for larger frames of a small board or 0.25 for smaller
+        frames (cells are at least one pixel wide).
+    """
+
+    def __init__(self, width, height, unit_size, scale=1):
+        if width % unit_size or height % unit_size:
+            raise ValueError(f"The board ({width}x{height}) must be a whole number of {unit_size}-pixel cells")
+        self.unit_size = unit_size
+        self.rows = height // unit_size
+        self.columns = width // unit_size
+        cell = max(1, round(unit_size * scale))
+        self.frame = np.zeros((self.rows * cell, self.columns * cell, 3), dtype=np.uint8)
+        self._cells = self.frame.reshape(self.rows, cell, self.columns, cell, 3)
+        # Clearing copies a ready-made background, much faster than broadcasting a color over the frame
+        self._background = np.empty_like(self.frame)
+        self._background[:] = BACKGROUND
+
+    def __call__(self, snakes, foods):
+        return self.render(snakes, foods)
+
+    def render(self, snakes, foods):
+        """
+        Paints a frame.
+
+        Parameters
+        ----------
+        snakes: Sequence[Sequence[[x, y]]]
+            The blocks of each snake, starting at the head (a single [x, y] head per snake also works).
+        foods: Sequence[[x, y]]
+            The food of each snake.
+
+        Returns
+        -------
+            The frame, shared between calls.
+        """
+        np.copyto(self.frame, self._background)
+        for snake, food, color in zip(snakes, foods, COLORS):
+            blocks = np.asarray(snake, dtype=np.int64).reshape(-1, 2)
+            self._paint(blocks[1:], color)
+            self._paint(np.asarray(food, dtype=np.int64).reshape(-1, 2), color)
+        for snake in snakes:
+            self._paint(np.asarray(snake, dtype=np.int64).reshape(-1, 2)[:1], HEAD)
+        return self.frame
+
+    def _paint(self, positions, color):
+        columns, rows = (positions // self.unit_size).T
+        inside = (rows >= 0) & (rows < self.rows) & (columns >= 0) & (columns < self.columns)
+        self._cells[rows[inside], :, columns[inside]] = color
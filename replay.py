@@ -0,0 +1,76 @@
+import numpy as np
+
+TRANSITION = np.dtype([
+    ("state", np.int64),
+    ("action", np.int64),
+    ("reward", np.float64),
+    ("next_state", np.int64),
+    ("done", np.bool_),
+])
+
+
+class ReplayBuffer:
+
+    """
+    Fixed-capacity experience replay backed by a preallocated structured array.
+
+    Transitions are stored by Q-table row (see QTable.row) rather than by raw observation, so one
+    transition takes 33 bytes whatever the size of the board. Once full, new transitions overwrite
+    the oldest ones, which keeps memory flat over arbitrarily long runs.
+
+    Attributes
+    ----------
+    transitions: np.ndarray
+        The (capacity,) array of TRANSITION records. Only the first `size` records are valid.
+
+    priorities: np.ndarray
+        The priority of each transition when prioritized sampling is enabled, None otherwise.
+    """
+
+    def __init__(self, capacity, prioritized=False, alpha=0.6, epsilon=1e-3):
+        self.capacity = capacity
+        self.transitions = np.zeros(capacity, dtype=TRANSITION)
+        self.priorities = np.zeros(capacity, dtype=np.float64) if prioritized else None
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self.position = 0
+        self.size = 0
+        self._max_priority = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        """
+        Stores a transition in O(1), overwriting the oldest one when the buffer is full.
+        New transitions get the highest priority seen so far, so they are replayed at least once.
+        """
+        self.transitions[self.position] = (state, action, reward, next_state, done)
+        if self.priorities is not None:
+            self.priorities[self.position] = self._max_priority
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        """
+        Samples a minibatch of transitions, uniformly or proportionally to priority ** alpha.
+
+        Returns
+        -------
+            The indices of the sampled transitions (for update_priorities) and the sampled records.
+        """
+        if self.priorities is None:
+            indices = np.random.randint(0, self.size, size=batch_size)
+        else:
+            probabilities = self.priorities[:self.size] ** self.alpha
+            probabilities /= probabilities.sum()
+            indices = np.random.choice(self.size, size=batch_size, p=probabilities)
+        return indices, self.transitions[indices]
+
+    def update_priorities(self, indices, td_errors):
+        """Sets the priorities of replayed transitions from their new TD errors."""
+        if self.priorities is None:
+            return
+        priorities = np.abs(td_errors) + self.epsilon
+        self.priorities[indices] = priorities
+        self._max_priority = max(self._max_priority, priorities.max())
@@ -0,0 +1,118 @@
+import csv
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from stats import DEATH_CAUSES
+from utils import compare_stats, plot_death_counts, standard_error
+
+# (file name, plot title, metric label) of the charts written for every report, as in snake-game.py
+CHARTS = [
+    ("steps", "Average Steps Comparison", "Steps per Episode"),
+    ("score", "Average Score Comparison", "Score per Episode"),
+    ("efficiency", "Score Efficiency Comparison", "Score/Steps per Episode"),
+]
+
+
+def write_report(output_dir, team_names, team_stats, colors, formats=("png", "svg"), confidence=0.95):
+    """
+    Writes the comparison charts and a summary table of a tournament to `output_dir`.
+
+    Every chart is drawn with the non-interactive Agg backend and saved once per format, as
+    steps.png, score.png, efficiency.png and deaths.png (and .svg). The summary table, summary.csv,
+    has one row per team with the number of episodes, the mean, std and confidence interval half-width
+    of each metric, the bounds of a bootstrap confidence interval of its mean (which does not assume the
+    metric is normally distributed) and the number of losses by cause.
+
+    Parameters
+    ----------
+    output_dir: str
+        The directory to write to (created if needed).
+    team_names: Sequence[str]
+        The name of each team, in the order of team_stats.
+    team_stats: Sequence[TeamStats]
+        The statistics of each team (see stats.py).
+    colors: Sequence[str]
+        A sequence of colors (one for each team).
+    formats: Sequence[str]
+        The image formats to save each chart in.
+    confidence: float
+        The confidence level of the error bars and confidence intervals.
+
+    Returns
+    -------
+        The list of files written.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+
+    for metric, title, label in CHARTS:
+        for extension in formats:
+            filename = os.path.join(output_dir, f"{metric}.{extension}")
+            compare_stats(
+                [getattr(stats, metric) for stats in team_stats],
+                confidence=confidence, title=title, metric=label, colors=colors,
+                show=False, filename=filename
+            )
+            files.append(filename)
+
+    for extension in formats:
+        filename = os.path.join(output_dir, f"deaths.{extension}")
+        plot_death_counts([stats.death_counts() for stats in team_stats], colors, show=False, filename=filename)
+        files.append(filename)
+
+    filename = os.path.join(output_dir, "summary.csv")
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        header = ["team", "episodes"]
+        for metric, _, _ in CHARTS:
+            header += [f"{metric}_mean", f"{metric}_std", f"{metric}_ci", f"{metric}_ci_low", f"{metric}_ci_high"]
+        writer.writerow(header + [death.lower() for death in DEATH_CAUSES])
+        for name, stats in zip(team_names, team_stats):
+            row = [name, stats.n]
+            for metric, _, _ in CHARTS:
+                stat = getattr(stats, metric)
+                # The resampling is seeded, so that the same results always give the same table
+                row += [stat.mean, stat.std, standard_error(stat.std, stat.n, confidence),
+                        *stats.bootstrap_ci(metric, confidence, seed=0)]
+            writer.writerow(row + stats.death_counts())
+    files.append(filename)
+
+    return files
+
+
+class ReportWriter:
+
+    """
+    Renders tournament reports (see write_report) in a background process.
+
+    `submit` returns as soon as the statistics are handed over, so the caller can start the next sweep
+    while matplotlib draws and saves the charts of the previous one. Nothing is ever shown on screen,
+    which lets unattended runs go through without anyone closing plot windows.
+
+    The process is spawned rather than forked: it starts at the first `submit`, when the tournament
+    already has Tk windows and threads, which a forked child would inherit in whatever state they are.
+    """
+
+    def __init__(self, formats=("png", "svg"), confidence=0.95):
+        self.formats = formats
+        self.confidence = confidence
+        self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        self._futures = []
+
+    def submit(self, output_dir, team_names, team_stats, colors):
+        """Queues a report and returns its Future (whose result is the list of files written)."""
+        future = self._executor.submit(
+            write_report, output_dir, list(team_names), list(team_stats), list(colors), self.formats, self.confidence)
+        self._futures.append(future)
+        return future
+
+    def close(self):
+        """Waits for the pending reports, raising the first rendering error if any, and returns their files."""
+        try:
+            return [file for future in self._futures for file in future.result()]
+        finally:
+            self._executor.shutdown()
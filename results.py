@@ -0,0 +1,176 @@
+import argparse
+import math
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodes (
+    run_id TEXT NOT NULL,
+    team TEXT NOT NULL,
+    agent1 TEXT NOT NULL,
+    agent2 TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    episode INTEGER NOT NULL,
+    steps INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    efficiency REAL NOT NULL,
+    death TEXT,
+    duration REAL NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS episodes_team ON episodes (team, death);
+CREATE INDEX IF NOT EXISTS episodes_run ON episodes (run_id);
+"""
+
+COLUMNS = ("run_id", "team", "agent1", "agent2", "seed", "episode", "steps", "score", "efficiency", "death",
+           "duration", "finished_at")
+
+
+class ResultsStore:
+
+    """
+    Appends the result of every finished episode to an SQLite database, one row per episode.
+
+    Rows are buffered and written with a single executemany per `batch_size` episodes (and on flush/close),
+    so storing results costs one transaction per batch rather than one per episode. Aggregations by team
+    and by cause of death run inside SQLite on the indexed columns, so comparing runs accumulated over
+    months of history does not load the episodes into Python.
+
+    Attributes
+    ----------
+    run_id: str
+        Identifies the episodes of this run in the store (defaults to the start time of the run).
+    """
+
+    def __init__(self, path, run_id=None, batch_size=64):
+        self.path = path
+        self.run_id = run_id if run_id is not None else time.strftime("%Y%m%d-%H%M%S")
+        self.batch_size = batch_size
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript(SCHEMA)
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add(self, team, agents, seed, episode, result, duration):
+        """
+        Queues the result of an episode.
+
+        Parameters
+        ----------
+        team: str
+            The name of the team.
+        agents: Sequence[str]
+            The agent type of each snake.
+        seed: int
+            The seed the episode was played with.
+        episode: int
+            The index of the episode for the team.
+        result: list
+            [steps, score, death], as returned by Game.get_results.
+        duration: float
+            Wall-clock duration of the episode, in seconds.
+        """
+        steps, score, death = result
+        self._pending.append((
+            self.run_id, team, agents[0], agents[1], seed, episode, steps, score, score / steps, death,
+            duration, time.time()))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with self._connection:
+                self._connection.executemany(
+                    f"INSERT INTO episodes ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                    self._pending)
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    # ####### #
+    # Queries #
+    # ####### #
+
+    def runs(self):
+        """Returns (run_id, episodes, start time, end time) for every run in the store."""
+        self.flush()
+        return self._connection.execute(
+            "SELECT run_id, COUNT(*), MIN(finished_at), MAX(finished_at) FROM episodes GROUP BY run_id ORDER BY MIN(finished_at)"
+        ).fetchall()
+
+    def summary_by_team(self, run_id=None):
+        """
+        Returns one row per team (and run, if `run_id` is None) with the number of episodes and the mean and
+        population standard deviation of the steps, score and efficiency, and the mean episode duration.
+        """
+        self.flush()
+        # SQLite has no standard deviation (nor, in most builds, SQRT), so it returns the first two moments
+        metrics = ", ".join(f"AVG({column}), AVG({column} * {column})" for column in ("steps", "score", "efficiency"))
+        query = f"SELECT run_id, team, COUNT(*), {metrics}, AVG(duration) FROM episodes"
+        rows = []
+        for run_id, team, n, *moments, duration in self._connection.execute(*self._grouped(query, run_id, "run_id, team")):
+            values = []
+            for mean, mean_square in zip(moments[::2], moments[1::2]):
+                values += [mean, math.sqrt(max(mean_square - mean * mean, 0.0))]
+            rows.append((run_id, team, n, *values, duration))
+        return rows
+
+    def deaths_by_team(self, run_id=None):
+        """Returns (run_id, team, death, count) rows counting the causes of loss of each team."""
+        self.flush()
+        query = "SELECT run_id, team, death, COUNT(*) FROM episodes"
+        return self._connection.execute(*self._grouped(query, run_id, "run_id, team, death")).fetchall()
+
+    def completed(self, run_id=None):
+        """
+        Returns the episodes stored for a run (this store's run by default) as a dict mapping (team, episode) to
+        (seed, [steps, score, death]), e.g. to resume the run after an interruption.
+        """
+        self.flush()
+        rows = self._connection.execute(
+            "SELECT team, episode, seed, steps, score, death FROM episodes WHERE run_id = ?",
+            (run_id if run_id is not None else self.run_id,))
+        return {(team, episode): (seed, [steps, score, death]) for team, episode, seed, steps, score, death in rows}
+
+    @staticmethod
+    def _grouped(query, run_id, group_by):
+        parameters = ()
+        if run_id is not None:
+            query += " WHERE run_id = ?"
+            parameters = (run_id,)
+        return f"{query} GROUP BY {group_by} ORDER BY {group_by}", parameters
+
+
+def main():
+    # Prints the aggregates of a results database, e.g. to compare runs without replaying them
+    parser = argparse.ArgumentParser()
+    parser.add_argument("database")
+    parser.add_argument("--run", default=None)
+    opt = parser.parse_args()
+
+    store = ResultsStore(opt.database)
+    try:
+        for run_id, n_episodes, started, finished in store.runs():
+            if opt.run is None or opt.run == run_id:
+                print(f"{run_id}: {n_episodes} episodes, {time.ctime(started)} - {time.ctime(finished)}")
+        print()
+        print(f"{'run':<16} {'team':<30} {'N':>5} {'steps':>16} {'score':>14} {'efficiency':>16} {'time (s)':>9}")
+        for run_id, team, n, *values, duration in store.summary_by_team(opt.run):
+            steps, score, efficiency = (f"{values[i]:.2f} ± {values[i + 1]:.2f}" for i in (0, 2, 4))
+            print(f"{run_id:<16} {team:<30} {n:>5} {steps:>16} {score:>14} {efficiency:>16} {duration:>9.3f}")
+        print()
+        for run_id, team, death, count in store.deaths_by_team(opt.run):
+            print(f"{run_id:<16} {team:<30} {death}: {count}")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
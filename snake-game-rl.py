@@ -1,17 +1,27 @@
+import functools
 import itertools
+import multiprocessing
+import pickle
+import queue
 import time
-import tkinter
 import random
 import numpy as np
 from agents import *
+from qtable import QTable, SharedQTable
+from replay import ReplayBuffer
+from encoders import RelativeFeatureEncoder
+from memory import MemoryMonitor
+from render import BoardRasterizer
 import argparse
-from gym import spaces, Wrapper
+import atexit
+import sys
 from typing import Sequence
 
 from utils import compare_results
 from utils import plot_deaths
-from ma_gym.envs.utils.observation_space import MultiAgentObservationSpace
-from ma_gym.envs.utils.action_space import MultiAgentActionSpace
+from utils import EarlyStopping
+from utils import report_imports
+from utils import time_imports
 
 
 CANVAS_WIDTH = 50  # Width of drawing canvas in pixels
@@ -29,35 +39,143 @@ ACTION_MEANING = {
 }
 
 
-def train_eval_loop_single(train_environment, eval_environment, agent, n_evaluations, n_training_episodes, n_eval_episodes,canvas,canvas2):
+def train_eval_loop_single(train_environment, eval_environment, agent, n_evaluations, n_training_episodes, n_eval_episodes,canvas,canvas2, checkpoint_path=None, checkpoint_every=0, evaluator=None, early_stopping=None, memory=None):
 
     print(f"Train-Eval Loop for {agent.name}\n")
 
-    results = np.zeros((n_evaluations, n_eval_episodes))
-
-    for evaluation in range(n_evaluations):
+    # Evaluations with a shrunk budget (see EarlyStopping) leave the remaining columns as NaN
+    results = np.full((n_evaluations, n_eval_episodes), np.nan)
+
+    # Resumed agents carry the number of iterations already completed, and of training episodes already
+    # played in the iteration that was interrupted
+    first_evaluation = agent.checkpoint_info.get("evaluations_done", 0)
+    episodes_done = agent.checkpoint_info.get("training_episodes_done", 0)
+    if first_evaluation > 0 or episodes_done > 0:
+        print(f"\tResuming from iteration {first_evaluation+1}/{n_evaluations}, training episode {episodes_done+1}")
+    if early_stopping is not None and "early_stopping" in agent.checkpoint_info:
+        early_stopping.restore(agent.checkpoint_info["early_stopping"])
+
+    def progress(**info):
+        # The training progress saved with every checkpoint, early stopping included
+        if early_stopping is not None:
+            info["early_stopping"] = early_stopping.state()
+        return info
+
+    # Snapshots waiting for their asynchronous evaluation, kept in case they turn out to be the best
+    best_candidates = {}
+
+    def record(evaluation, evaluation_results):
+        results[evaluation, :len(evaluation_results)] = evaluation_results
+        print(f"\t\tSnapshot {evaluation+1} Average Steps To Capture: {round(evaluation_results.mean(), 2)}")
+        if early_stopping is not None and early_stopping.update(evaluation, evaluation_results):
+            print(f"\t\tNew best snapshot ({round(early_stopping.best_mean, 2)} +/- {round(early_stopping.interval, 2)})")
+            if checkpoint_path is not None:
+                agent_snapshot = agent.snapshot() if evaluator is None else best_candidates.pop(evaluation)
+                agent_snapshot.checkpoint(checkpoint_path + "-best", evaluation=evaluation)
+        best_candidates.pop(evaluation, None)
+
+    for evaluation in range(first_evaluation, n_evaluations):
 
         print(f"\tIteration {evaluation+1}/{n_evaluations}")
 
         # Train
-        print(f"\t\tTraining {agent.name} for {n_training_episodes} episodes.")
+        print(f"\t\tTraining {agent.name} for {n_training_episodes - episodes_done} episodes.")
         agent.train()   # Enables training mode
 
-        run_single(train_environment, agent, n_training_episodes)
+        checkpoint = None
+        if checkpoint_path is not None and checkpoint_every > 0:
+            checkpoint = lambda episodes, done=episodes_done: agent.checkpoint(
+                checkpoint_path, **progress(evaluations_done=evaluation, training_episodes_done=done + episodes))
 
-        # Eval
-        print(f"\t\tEvaluating {agent.name} for {n_eval_episodes} episodes.")
-        agent.eval()    # Disables training mode
+        run_single(train_environment, agent, n_training_episodes - episodes_done, checkpoint, checkpoint_every, memory)
+        episodes_done = 0
 
-        results[evaluation] = run_single(eval_environment,agent,n_eval_episodes)
+        # Eval
+        if evaluator is not None:
+            # The snapshot is evaluated in the background while the next iteration trains
+            print(f"\t\tSubmitting snapshot {evaluation+1} of {agent.name} for evaluation.")
+            if early_stopping is not None and checkpoint_path is not None:
+                best_candidates[evaluation] = agent.snapshot()
+            evaluator.submit(evaluation, agent)
+            for version, version_results in evaluator.poll():
+                record(version, version_results)
+        else:
+            n_episodes = n_eval_episodes if early_stopping is None else early_stopping.eval_episodes(n_eval_episodes)
+            print(f"\t\tEvaluating {agent.name} for {n_episodes} episodes.")
+            agent.eval()    # Disables training mode
 
-        print(f"\t\tAverage Steps To Capture: {round(results[evaluation].mean(), 2)}")
+            record(evaluation, run_single(eval_environment,agent,n_episodes, memory=memory))
         print()
 
+        if checkpoint_path is not None:
+            agent.checkpoint(checkpoint_path, **progress(evaluations_done=evaluation+1, training_episodes_done=0))
+
+        if early_stopping is not None and early_stopping.should_stop:
+            print(f"\tStopping early: no improvement in {early_stopping.patience} evaluations, "
+                  f"best snapshot was {early_stopping.best_evaluation+1}.")
+            break
+
+    if evaluator is not None:
+        for version, version_results in evaluator.wait():
+            record(version, version_results)
+
     return results
 
 
-def run_single(environment, agent, n_episodes):
+class AsyncEvaluator:
+    """
+    Evaluates frozen snapshots of an agent in a separate process while training continues.
+
+    Each submitted snapshot is tagged with a version (the train-eval iteration) and its evaluation
+    results are streamed back with that tag, in the order they finish.
+    """
+
+    def __init__(self, make_environment, n_episodes, profile_imports=False):
+        self._snapshots = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._pending = 0
+        self._process = multiprocessing.Process(
+            target=run_evaluator, args=(make_environment, n_episodes, self._snapshots, self._results, profile_imports),
+            daemon=True)
+        self._process.start()
+
+    def submit(self, version, agent):
+        # Pickled right away: Queue.put pickles in a feeder thread, after training may have moved on
+        self._snapshots.put((version, pickle.dumps(agent.snapshot())))
+        self._pending += 1
+
+    def poll(self):
+        """Returns the (version, results) pairs that finished so far, without blocking."""
+        finished = []
+        while self._pending > 0:
+            try:
+                finished.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+            self._pending -= 1
+        return finished
+
+    def wait(self):
+        """Blocks until every submitted snapshot has been evaluated and returns their results."""
+        finished = [self._results.get() for _ in range(self._pending)]
+        self._pending = 0
+        return finished
+
+    def close(self):
+        self._snapshots.put(None)
+        self._process.join()
+
+
+def run_evaluator(make_environment, n_episodes, snapshots, results, profile_imports=False):
+    environment = make_environment()
+    for version, snapshot in iter(snapshots.get, None):
+        results.put((version, run_single(environment, pickle.loads(snapshot), n_episodes)))
+
+    if profile_imports:
+        report_imports("evaluator")
+
+
+def run_single(environment, agent, n_episodes, checkpoint=None, checkpoint_every=0, memory=None):
 
     results = np.zeros(n_episodes)
 
@@ -78,10 +196,114 @@ def run_single(environment, agent, n_episodes):
         environment.close()
         results[episode] = steps
 
+        if memory is not None:
+            # The tkinter games reuse their canvas across episodes, so leftover items pile up there
+            memory.episode_end([getattr(environment, "canvas", None)])
+
+        if checkpoint is not None and (episode + 1) % checkpoint_every == 0:
+            checkpoint(episode + 1)
+
     return results
 
 
 
+def train_eval_loop_parallel(make_environment, agent, n_workers, n_evaluations, n_training_episodes, n_eval_episodes, profile_imports=False, seed=None):
+    """
+    Coordinator of the parallel training mode.
+
+    Starts `n_workers` processes that each build their own headless environment with `make_environment`
+    and share the agent's Q-table (a SharedQTable). Every iteration the training episodes are split
+    across the workers, and once all of them are done the coordinator schedules the evaluation pass
+    on the same workers, with training disabled.
+
+    Worker i is seeded with `seed + i`; without a seed one is drawn and printed, so that the run can be
+    repeated (up to the order in which the workers update the shared Q-table).
+    """
+
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    print(f"Parallel Train-Eval Loop for {agent.name} with {n_workers} workers (seed {seed})\n")
+
+    results = np.zeros((n_evaluations, n_eval_episodes))
+
+    tasks = multiprocessing.Queue()
+    replies = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=run_worker, args=(worker_id, make_environment, agent, tasks, replies, profile_imports, seed + worker_id),
+            daemon=True)
+        for worker_id in range(n_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    try:
+        for evaluation in range(n_evaluations):
+
+            print(f"\tIteration {evaluation+1}/{n_evaluations}")
+
+            print(f"\t\tTraining {agent.name} for {n_training_episodes} episodes.")
+            run_parallel(tasks, replies, True, n_training_episodes, n_workers)
+
+            print(f"\t\tEvaluating {agent.name} for {n_eval_episodes} episodes.")
+            results[evaluation] = run_parallel(tasks, replies, False, n_eval_episodes, n_workers)
+
+            print(f"\t\tAverage Steps To Capture: {round(results[evaluation].mean(), 2)}")
+            print()
+    finally:
+        for _ in workers:
+            tasks.put(None)
+        for worker in workers:
+            worker.join()
+
+    return results
+
+
+def run_parallel(tasks, replies, training, n_episodes, n_workers):
+    """
+    Splits `n_episodes` into one chunk per worker and waits for all of them to finish.
+    Returns the results of every episode, ordered by chunk.
+    """
+    chunks = [len(chunk) for chunk in np.array_split(np.arange(n_episodes), n_workers) if len(chunk) > 0]
+    for chunk_id, n_chunk_episodes in enumerate(chunks):
+        tasks.put((chunk_id, training, n_chunk_episodes))
+
+    chunk_results = dict(replies.get() for _ in chunks)
+    return np.concatenate([chunk_results[chunk_id] for chunk_id in range(len(chunks))])
+
+
+def run_worker(worker_id, make_environment, agent, tasks, replies, profile_imports=False, seed=None):
+    """
+    Worker loop of the parallel training mode: runs episode chunks until it receives None.
+    """
+    # Forked workers inherit the parent's random state and would otherwise play identical episodes
+    random.seed(seed)
+    np.random.seed(seed)
+
+    environment = make_environment()
+    # Seeds the food placement of the SnakeEnv, whose later resets carry on from this state
+    environment.env.reset(seed=seed)
+
+    for chunk_id, training, n_episodes in iter(tasks.get, None):
+        if training:
+            agent.train()
+        else:
+            agent.eval()
+        replies.put((chunk_id, run_single(environment, agent, n_episodes)))
+
+    if profile_imports:
+        report_imports(f"worker {worker_id}")
+
+
+def make_environment(encoder=None):
+    """
+    Builds a headless joint-action environment, as used by the parallel workers and the evaluator.
+    """
+    from snake_env import SnakeEnv
+
+    return JointActionWrapper(SnakeEnv(CANVAS_WIDTH, CANVAS_HEIGHT, UNIT_SIZE, snake_size=INITIAL_SNAKE_SIZE), encoder)
+
+
 def results_by_type(results):
     step_results = []
     score_results = []
@@ -108,6 +330,20 @@ def results_by_type(results):
     return [step_results, score_results, efficiency_results, death_results]
 
 
+def create_learner(learner_type, action_counts, **kwargs):
+    """
+    Creates the multi-agent learner: a centralized QLearning over the joint actions, or a
+    FactorizedQLearning with one Q-function per agent ("independent" or "vdn").
+    """
+    if learner_type == "centralized":
+        return QLearning(int(np.prod(action_counts)), **kwargs)
+    elif learner_type in FactorizedQLearning.MODES:
+        return FactorizedQLearning(action_counts, learner_type, **kwargs)
+    else:
+        print("Invalid learner type provided. Please refer to the README.md for further instructions")
+        exit()
+
+
 def create_team(agent_type, canvas, debug):
 
     if agent_type in ["random", "fully_greedy", "part_greedy", "social_convention", "intention_comm", "rl"]:
@@ -121,6 +357,8 @@ def make_canvas(width, height, title, root):
         """
         Method to create a canvas that acts as a base for all the objects in the game
         """
+        import tkinter
+
         root.minsize(width=width, height=height)
         root.title(title)
 
@@ -178,6 +416,7 @@ class Snake:
         """
         initial_x = (INITIAL_SNAKE_SIZE - 1)*UNIT_SIZE
         initial_y = self.id*CANVAS_HEIGHT / 3 - UNIT_SIZE
+        self.head_position = [initial_x, initial_y]
         
         # create head
         self.body.append(self.canvas.create_oval(
@@ -248,6 +487,8 @@ class Snake:
         # move head
         snake_head_tag = self.get_head_tag()
         self.canvas.move(snake_head_tag, self.direction_x * UNIT_SIZE, self.direction_y * UNIT_SIZE)
+        self.head_position[0] += self.direction_x * UNIT_SIZE
+        self.head_position[1] += self.direction_y * UNIT_SIZE
 
     def get_head_tag(self):
         return 'snake_' + str(self.id) + '&&head'
@@ -285,14 +526,21 @@ class Game:
         self._agent_view_mask = (4, 4)
         self.reward_range = [-100,100]
 
+        from gym import spaces
+        from ma_gym.envs.utils.observation_space import MultiAgentObservationSpace
+        from ma_gym.envs.utils.action_space import MultiAgentActionSpace
+
         self.action_space = MultiAgentActionSpace([spaces.Discrete(4) for _ in range(self.n_agents)])
+        # (col, row) grid cells of every agent and prey, updated with every move and capture
         self.agent_pos = {_: None for _ in range(self.n_agents)}
         self.prey_pos = {_: None for _ in range(self.n_food)}
+        self._features = np.zeros(2 * (self.n_agents + self.n_food), dtype=np.int64)
         self._prey_alive = None
 
         self._agent_dones = [False for _ in range(self.n_agents)]
 
         self.viewer = None
+        self._rasterizer = None
 
 
         # agent pos (2), prey (25), step (1)
@@ -314,28 +562,32 @@ class Game:
 
 
     def simplified_features(self):
+        """
+        Returns the grid cells of the agents followed by those of the preys, as [col, row] pairs.
 
-        current_grid = np.array(self._full_obs)
+        The cells are read from the position index kept up to date by step/reset, so this is O(N)
+        whatever the size of the map. The returned array is reused between calls: copy it to keep it.
+        """
+        features = self._features
 
-        agent_pos = []
         for agent_id in range(self.n_agents):
-            tag = f"A{agent_id + 1}"
-            row, col = np.where(current_grid == tag)
-            row = row[0]
-            col = col[0]
-            agent_pos.append((col, row))
+            features[2 * agent_id: 2 * agent_id + 2] = self.agent_pos[agent_id]
 
-        prey_pos = []
+        offset = 2 * self.n_agents
         for prey_id in range(self.n_food):
-            tag = f"P{prey_id + 1}"
-            row, col = np.where(current_grid == tag)
-            row = row[0]
-            col = col[0]
-            prey_pos.append((col, row))
-
-        features = np.array(agent_pos + prey_pos).reshape(-1)
+            features[offset + 2 * prey_id: offset + 2 * prey_id + 2] = self.prey_pos[prey_id]
 
         return features
+
+    def update_agent_positions(self):
+        """
+        Updates the position index with the current heads of the snakes.
+        """
+        for agent_id, snake in enumerate([self.snake1, self.snake2]):
+            self.agent_pos[agent_id] = self.grid_cell(snake.head_position)
+
+    def grid_cell(self, position):
+        return int(position[0] // UNIT_SIZE), int(position[1] // UNIT_SIZE)
     
     def get_action_meanings(self, agent_i=None):
         if agent_i is not None:
@@ -439,6 +691,7 @@ class Game:
             
             new_id, position = self.place_food(snake.color)
             snake.new_food(new_id)
+            self.prey_pos[snake.id - 1] = self.grid_cell(position)
             if (snake.id == 1):
                 self.food1 = position
                 self.reward1= 10
@@ -463,6 +716,8 @@ class Game:
         """
         Method to print out the final message and declare the winner based on player scores
         """
+        import tkinter
+
         print("Episode Over!")
         print(f"\nSteps: {self.steps} \nScore: {self.score} \nCase of death snake 1: {self.snake1.death} \nCase of death snake 2: {self.snake2.death} "
         )
@@ -479,6 +734,8 @@ class Game:
         """
         Method to display introductory messages on screen before the start of the game
         """
+        import tkinter
+
         widget = tkinter.Label(
             self.canvas, 
             text=message, 
@@ -500,10 +757,22 @@ class Game:
     def get_food_positions(self):
         return [self.food1, self.food2]
 
+    def render(self, mode='human'):
+        """
+        Renders the game. In 'rgb_array' mode the board is painted offscreen into a (height x width x 3)
+        uint8 array (see BoardRasterizer), which is reused between calls. In 'human' mode the window is redrawn.
+        """
+        if mode == 'rgb_array':
+            if self._rasterizer is None:
+                self._rasterizer = BoardRasterizer(CANVAS_WIDTH, CANVAS_HEIGHT, UNIT_SIZE)
+            return self._rasterizer.render(self.get_snake_positions(), self.get_food_positions())
+        self.canvas.update()
+
     def step(self, action):
        
         self.move_snake(self.snake1)
         self.move_snake(self.snake2)
+        self.update_agent_positions()
         self.steps+=1
         self.canvas.update()
         self.update_game()
@@ -533,6 +802,10 @@ class Game:
         self.snake1.new_food(id1)
         self.snake2.new_food(id2)
 
+        self.update_agent_positions()
+        self.prey_pos[0] = self.grid_cell(food1)
+        self.prey_pos[1] = self.grid_cell(food2)
+
         snakes_pos = self.get_snake_positions()
         food_pos = self.get_food_positions()
         positions = ([snakes_pos, food_pos])
@@ -557,7 +830,7 @@ class Game:
 
 
 
-class JointActionWrapper(Wrapper):
+class JointActionWrapper:
 
     """ A Wrapper for centralized multi-agent environments.
 
@@ -575,16 +848,22 @@ class JointActionWrapper(Wrapper):
     | 0        | 1        | 1            |
     | 1        | 0        | 2            |
     | 1        | 1        | 3            |
+
+    An optional `encoder` (see encoders.py) turns the shared observations into integer state indices,
+    whose number is exposed as `n_states`.
+
+    Like a gym.Wrapper, unknown attributes are forwarded to the wrapped environment, but without
+    importing gym, so that workers that only need the wrapper do not pay for it.
     """
 
-    def __init__(self, env):
+    def __init__(self, env, encoder=None):
 
-        super(JointActionWrapper, self).__init__(env)
+        self.env = env
 
-        self.n_agents = env.n_agents
+        self.encoder = encoder
+        self.n_states = encoder.n_states if encoder is not None else None
 
-        self.snake1 = env.snake1
-        self.snake2 = env.snake2
+        self.n_agents = env.n_agents
 
         self.action_spaces = [list(range(env.action_space[a].n)) for a in range(self.n_agents)]
         self.joint_action_space = list(itertools.product(*self.action_spaces))
@@ -595,16 +874,30 @@ class JointActionWrapper(Wrapper):
         self.n_joint_actions = len(self.joint_action_meanings)
 
     def reset(self):
-        observations = super(JointActionWrapper, self).reset()
-        observation = observations[0]   # For the predator-prey domain, the observations are shared.
+        observations = self.env.reset()
+        observation = observations[0]   # For the predator-prey domain, the observations are shared. For SnakeEnv, (observation, info).
+        if self.encoder is not None:
+            return self.encoder(observation)
         return observation
 
     def step(self, joint_action: int):
 
         individual_actions: Sequence[int] = self.joint_action_space[joint_action]
-        next_observations, rewards, terminals, info = super(JointActionWrapper, self).step(individual_actions)
+        step = self.env.step(individual_actions)
+
+        if len(step) == 5:
+            # Gym API (SnakeEnv): the observation and the team reward are already shared
+            next_observation, reward, terminated, truncated, info = step
+            terminal = terminated or truncated
+            if self.encoder is not None:
+                next_observation = self.encoder(next_observation)
+            return next_observation, reward, terminal, info
+
+        next_observations, rewards, terminals, info = step
 
         next_observation = next_observations[0]    # For the predator-prey domain, the observations are shared.
+        if self.encoder is not None:
+            next_observation = self.encoder(next_observations)
         equal_rewards = all(rewards[0] == reward for reward in rewards)
         assert equal_rewards, "Multi-Agent RL requires same reward signal for all agents"
         reward = rewards[0]
@@ -615,36 +908,138 @@ class JointActionWrapper(Wrapper):
     def get_action_meanings(self):
         return self.team_action_meanings
 
+    def close(self):
+        return self.env.close()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(f"accessing private attribute '{name}' is prohibited")
+        return getattr(self.env, name)
+
 def main():
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--episodes-per-training", type=int, default=100)
     parser.add_argument("--episodes-per-evaluation", type=int, default=64)
     parser.add_argument("--evaluations", type=int, default=10)
+    parser.add_argument("--checkpoint", default="")
+    parser.add_argument("--checkpoint-every", type=int, default=0)
+    parser.add_argument("--resume", default="")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--replay-capacity", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--prioritized-replay", default="")
+    parser.add_argument("--state-encoder", default="")
+    parser.add_argument("--learner", default="centralized")
+    parser.add_argument("--async-evaluation", default="")
+    parser.add_argument("--early-stopping-patience", type=int, default=0)
+    parser.add_argument("--early-stopping-delta", type=float, default=0.0)
+    parser.add_argument("--early-stopping-mode", default="", choices=["", "max", "min"])
+    parser.add_argument("--profile-imports", default="")
+    parser.add_argument("--headless", default="")
+    parser.add_argument("--memory-check", default="")
+    parser.add_argument("--memory-threshold", type=float, default=64)
     opt = parser.parse_args()
+    if opt.workers > 1 and (opt.checkpoint or opt.resume):
+        parser.error("--checkpoint and --resume are not supported with --workers (the shared Q-table is not saved)")
+    if opt.early_stopping_patience > 0 and not opt.early_stopping_mode:
+        parser.error("--early-stopping-patience needs --early-stopping-mode (max or min steps per episode)")
+
+    profile_imports = opt.profile_imports == "true"
+    if profile_imports:
+        time_imports()
+        atexit.register(report_imports)
+
+    encoder = None
+    if opt.state_encoder == "relative":
+        encoder = RelativeFeatureEncoder(CANVAS_WIDTH, CANVAS_HEIGHT, UNIT_SIZE)
+    n_states = encoder.n_states if encoder is not None else None
+
+    replay = None
+    if opt.replay_capacity > 0:
+        replay = ReplayBuffer(opt.replay_capacity, prioritized=opt.prioritized_replay == "true")
+
+    if opt.workers > 1:
+        # Every worker builds its own environment, so the coordinator never opens a window
+        action_counts = [len(ACTION_MEANING)] * 2
+        n_columns = np.prod(action_counts) if opt.learner == "centralized" else np.sum(action_counts)
+        # Encoded states are one integer, raw observations the [x, y] of both heads and both foods (see SnakeEnv)
+        shared_q_table = SharedQTable(
+            int(n_columns), capacity=n_states or 2 ** 18, key_size=1 if encoder is not None else 8)
+        multi_agent_learner = create_learner(
+            opt.learner, action_counts, q_table=shared_q_table, replay=replay, batch_size=opt.batch_size, n_states=n_states)
+        try:
+            train_eval_loop_parallel(
+                functools.partial(make_environment, encoder), multi_agent_learner, opt.workers,
+                opt.evaluations, opt.episodes_per_training, opt.episodes_per_evaluation, profile_imports, opt.seed)
+        finally:
+            shared_q_table.close()
+        return
+
+    evaluator = None
+    if opt.async_evaluation == "true":
+        # Started before any window is created, so that the forked evaluator does not inherit tkinter's state
+        evaluator = AsyncEvaluator(
+            functools.partial(make_environment, encoder), opt.episodes_per_evaluation, profile_imports)
+
+    if opt.headless == "true":
+        canvas = canvas2 = None
+        joint_train_environment = make_environment(encoder)
+        joint_eval_environment = make_environment(encoder)
 
-    root = tkinter.Tk()
-    root2 = tkinter.Tk()
+    else:
+        import tkinter
+
+        root = tkinter.Tk()
+        root2 = tkinter.Tk()
 
-    canvas = make_canvas(CANVAS_WIDTH, CANVAS_HEIGHT, 'Snake Game', root)
-    canvas2 = make_canvas(CANVAS_WIDTH, CANVAS_HEIGHT, 'Snake Game', root)
+        canvas = make_canvas(CANVAS_WIDTH, CANVAS_HEIGHT, 'Snake Game', root)
+        canvas2 = make_canvas(CANVAS_WIDTH, CANVAS_HEIGHT, 'Snake Game', root)
 
-    team = create_team("rl", canvas, False)
-    team2 = create_team("rl", canvas2, False)
+        team = create_team("rl", canvas, False)
+        team2 = create_team("rl", canvas2, False)
 
-    train_run = Game(root, team, canvas)
-    eval_run = Game(root2, team, canvas2)
+        train_run = Game(root, team, canvas)
+        eval_run = Game(root2, team, canvas2)
         
 
-    joint_train_environment = JointActionWrapper(train_run)
-    joint_eval_environment = JointActionWrapper(eval_run)
-    centralized_multi_agent_learner = QLearning(joint_train_environment.n_joint_actions)
+        joint_train_environment = JointActionWrapper(train_run, encoder)
+        joint_eval_environment = JointActionWrapper(eval_run, encoder)
+
+    checkpoint_path = opt.checkpoint or None
+    if opt.resume == "true" and checkpoint_path is not None and QTable.exists(checkpoint_path):
+        learner_class = QLearning if opt.learner == "centralized" else FactorizedQLearning
+        multi_agent_learner = learner_class.from_checkpoint(
+            checkpoint_path, replay=replay, batch_size=opt.batch_size)
+    else:
+        action_counts = [len(actions) for actions in joint_train_environment.action_spaces]
+        multi_agent_learner = create_learner(
+            opt.learner, action_counts, replay=replay, batch_size=opt.batch_size,
+            n_states=joint_train_environment.n_states)
+    
+    early_stopping = None
+    if opt.early_stopping_patience > 0:
+        early_stopping = EarlyStopping(opt.early_stopping_mode, opt.early_stopping_patience, opt.early_stopping_delta)
+
+    memory = None
+    if opt.memory_check == "true":
+        memory = MemoryMonitor(max_bytes_per_episode=opt.memory_threshold * 1024)
+        memory.start()
     
         #results = run.get_results()
         #root.destroy() # uncomment for automatic closure of the window after the game 
-    train_eval_loop_single(
-        joint_train_environment, joint_eval_environment, centralized_multi_agent_learner,
-        opt.evaluations, opt.episodes_per_training, opt.episodes_per_evaluation,canvas,canvas2)
+    try:
+        train_eval_loop_single(
+            joint_train_environment, joint_eval_environment, multi_agent_learner,
+            opt.evaluations, opt.episodes_per_training, opt.episodes_per_evaluation,canvas,canvas2,
+            checkpoint_path, opt.checkpoint_every, evaluator, early_stopping, memory)
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+
+    if memory is not None and not memory.report():
+        sys.exit(1)
         
 
 if __name__ == '__main__':
@@ -1,13 +1,29 @@
+import functools
 import time
-import tkinter
 import random
 import numpy as np
 from agents import *
 import argparse
-from tqdm import tqdm
-
-from utils import compare_results
-from utils import plot_deaths
+import atexit
+import collections
+import math
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+
+from memory import MemoryMonitor
+from metrics import Metrics
+from report import ReportWriter
+from results import ResultsStore
+from stats import TeamStats
+from video import VideoExporter
+from utils import AdaptiveBudget
+from utils import compare_stats
+from utils import plot_death_counts
+from utils import report_imports
+from utils import time_imports
 
 CANVAS_WIDTH = 600  # Width of drawing canvas in pixels
 CANVAS_HEIGHT = 600  # Height of drawing canvas in pixels
@@ -16,47 +32,15 @@ UNIT_SIZE = 20  # Decides how thick the snake is
 MAX_STEPS = 500 # Maximum steps in an episode
 INITIAL_SNAKE_SIZE = 7
 
-def results_by_type(results):
-    """
-    Organizes the given results into separate lists based on their types.
-
-    Args:
-        results (list): List of team results, where each team result is a list of individual episode results.
-
-    Returns:
-        list: A list containing separate lists for each metric (steps, scores, efficiency, deaths).
-    """
-    step_results = []
-    score_results = []
-    efficiency_results = []
-    death_results = []
-    
-    for team in results:
-        team_step = []
-        team_score = []
-        team_efficiency = []
-        team_death = []
-        
-        for result in team:
-            team_step += [result[0]]
-            team_score += [result[1]]
-            team_efficiency += [result[1]/result[0]]
-            team_death += [result[2]]
-        
-        step_results += [team_step]
-        score_results += [team_score]
-        efficiency_results += [team_efficiency]
-        death_results += [team_death]
-    
-    return [step_results, score_results, efficiency_results, death_results]
-
+# Immutable state of a game, published by the simulation for the views (positions are (x, y) tuples)
+Snapshot = collections.namedtuple("Snapshot", ["steps", "score", "snakes", "foods", "game_over"])
 
-def create_team(agent_type, canvas, debug):
+def create_team(agent_type, debug):
     """
     Creates a team of two snakes based on the specified agent type.
     """
     if agent_type in ["random", "fully_greedy", "part_greedy", "social_convention", "intention_comm"]:
-        return [Snake(1, 'brown', canvas, agent_type, debug), Snake(2, 'green', canvas, agent_type, debug)]
+        return [Snake(1, 'brown', agent_type, debug), Snake(2, 'green', agent_type, debug)]
 
     else:
         print("Invalid agent type provided. Please refer to the README.md for further instructions")
@@ -66,6 +50,8 @@ def make_canvas(width, height, title, root):
     """
     Creates a canvas that serves as the base for all the objects in the game.
     """
+    import tkinter
+
     root.minsize(width=width, height=height)
     root.title(title)
 
@@ -80,27 +66,23 @@ class Snake:
     Attributes:
         id (int): The identifier for the snake.
         color (str): The color of the snake.
-        canvas (tkinter.Canvas): The canvas on which the snake is displayed.
         agent_type (str): The type of agent controlling the snake.
         debug (bool): A flag indicating whether debug mode is enabled or not.
         direction_x (int): The horizontal direction of the snake's movement (-1 for left, 1 for right).
         direction_y (int): The vertical direction of the snake's movement (-1 for up, 1 for down).
-        body (list): A list of object IDs representing the snake's body blocks.
+        positions (list): The [x, y] position of each block of the snake, starting at the head.
         death: Placeholder for the snake's death status.
-        food (int): The ID of the food the snake is currently targeting.
         communicates (bool): Indicates whether the snake can communicate with other snakes.
 
     """
-    def __init__(self, id, color, canvas, agent_type, debug):
-        self.canvas = canvas
+    def __init__(self, id, color, agent_type, debug):
         self.id = id
         self.color = color
         self.direction_x = 1
         self.direction_y = 0
-        self.body = []
+        self.positions = []
         self.death = None
         self.initialize_snake()
-        self.food = 0
         self.communicates = False
 
         if (agent_type == "random"):
@@ -115,52 +97,16 @@ class Snake:
             self.agent = IntentionCommunicationAgent(id, debug)
             self.communicates = True
 
-    def new_food(self, food_id):
-        """
-        Sets the ID of the food the snake is targeting.
-        """
-        self.food = food_id
-
-    def new_canvas(self, canvas):
-        """
-        Updates the canvas on which the snake is displayed.
-        """
-        self.canvas = canvas
-
     def initialize_snake(self):
         """
-        Initializes the snake's body by creating the head and initial blocks.
+        Initializes the positions of the snake's head and initial blocks.
         """
         initial_x = (INITIAL_SNAKE_SIZE - 1)*UNIT_SIZE
         initial_y = self.id*CANVAS_HEIGHT / 3 - UNIT_SIZE
-        
-        # create head
-        self.body.append(self.canvas.create_oval(
-            initial_x, 
-            initial_y,
-            initial_x + UNIT_SIZE, 
-            initial_y + UNIT_SIZE,
-            fill='orange', outline='brown',
-            tags=('snake_' + str(self.id), 'head')
-        ))
-
-        # complete body
-        for block_index in range(1,INITIAL_SNAKE_SIZE):
-            x0 = initial_x - block_index * UNIT_SIZE
-            snake_block = self.create_block(
-                x0, 
-                initial_y, 
-                x0+UNIT_SIZE, 
-                initial_y + UNIT_SIZE,
-            )
-            self.body.append(snake_block)
-
-    def create_block(self, x0, y0, x1, y1):
-        """
-        Creates a single block for the snake based on the given coordinates.
-        """
-        return self.canvas.create_rectangle(x0, y0, x1, y1, fill=self.color, tags='snake_' + str(self.id))
-    
+
+        for block_index in range(INITIAL_SNAKE_SIZE):
+            self.positions.append([int(initial_x - block_index * UNIT_SIZE), int(initial_y)])
+
     def body_position(self):
         """
         Retrieves the current positions of the snake's body blocks.
@@ -168,15 +114,12 @@ class Snake:
         Returns:
             list: A list of lists containing the x and y coordinates of each body block.
         """
-        position = []
-        for block in self.body:
-            pos = self.canvas.coords(block)[:2]
-            position.append([int(x) for x in pos])
-        return position
+        return [list(position) for position in self.positions]
 
     def move(self, direction):
         """
         Moves the snake in the specified direction.
+        Only the positions change here, the views draw them from the game's snapshots.
 
         Args:
             direction (tuple): A tuple containing the horizontal and vertical movement values (move_x, move_y).
@@ -186,54 +129,441 @@ class Snake:
         self.direction_x=move_x
         self.direction_y=move_y
 
-        # move body block to the position of block in front
-        blocks = self.body[:]
-        blocks.reverse()
-        for i, block in enumerate(blocks[:len(blocks)-1]):
-            self.canvas.moveto(
-                block, 
-                self.canvas.coords(blocks[i+1])[0] -1,
-                self.canvas.coords(blocks[i+1])[1] -1
-            )
+        # every block takes the position of the block in front, and the head moves one unit
+        head_x, head_y = self.positions[0]
+        new_head = [head_x + self.direction_x * UNIT_SIZE, head_y + self.direction_y * UNIT_SIZE]
+        self.positions = [new_head] + self.positions[:-1]
+
+class SnapshotQueue:
+    """
+    Publishes snapshots of a Game to a queue, from which a GameViewer draws them on the Tk thread.
+
+    A snapshot is published every `every` steps or, if `fps` is given, whenever 1/fps seconds passed since the
+    previous one. Publishing never waits for the viewer: when the queue is full the snapshot is dropped, as the
+    next one supersedes it anyway, and the first and last snapshots of a game (which are forced) make room by
+    dropping the oldest one waiting.
+
+    Attributes:
+        queue (queue.Queue): The published snapshots.
+        every (int): Publish one snapshot every `every` steps.
+        fps (float): If given, publish snapshots at this rate instead, whatever the number of steps.
+        dropped (int): The number of snapshots dropped because the queue was full.
+    """
+    def __init__(self, every=1, fps=None, maxsize=4):
+        self.queue = queue.Queue(maxsize)
+        self.every = every
+        self.fps = fps
+        self.dropped = 0
+        self._last_published = 0.0
+
+    @property
+    def realtime(self):
+        """Whether every step is shown, in which case the game is slowed down to SPEED steps per second."""
+        return self.every == 1 and self.fps is None
+
+    def publish(self, game, force=False):
+        """
+        Publishes a snapshot of the game if one is due (or if `force` is set).
+        """
+        if not force:
+            if self.fps is not None:
+                if time.perf_counter() - self._last_published < 1 / self.fps:
+                    return
+            elif game.steps % self.every != 0:
+                return
+
+        self._last_published = time.perf_counter()
+        self.put(game.snapshot(), force)
+
+    def put(self, snapshot, force):
+        try:
+            self.queue.put_nowait(snapshot)
+        except queue.Full:
+            if not force:
+                self.dropped += 1
+                return
+            # the game is the only producer, so once an item is taken there is room for the forced snapshot
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(snapshot)
+
+class TilePublisher(SnapshotQueue):
+    """
+    Publishes the snapshots of a game played by a parallel worker, as (tile, title, snapshot) messages on a
+    queue shared with the other workers, from which a TiledViewer draws them.
+
+    Attributes:
+        tile (int): The tile of the worker in the viewer.
+        title (str): Describes the game (team and episode) on its tile.
+    """
+    def __init__(self, snapshots, tile, title, every=1, fps=None):
+        super().__init__(every, fps)
+        self.queue = snapshots
+        self.tile = tile
+        self.title = title
+
+    def put(self, snapshot, force):
+        # the queue is shared, so forced snapshots wait for room (the viewer drains it continuously)
+        try:
+            self.queue.put((self.tile, self.title, snapshot), block=force)
+        except queue.Full:
+            self.dropped += 1
+
+class CanvasRenderer:
+    """
+    Draws snapshots of a game on a canvas, touching only the items that changed since the previous one.
+
+    The items are created from the first snapshot. Then only the head and the blocks whose position is no
+    longer occupied are moved (a block freed at the tail is moved to the new position behind the head), the
+    food ovals are moved only after being eaten and the boards are only rewritten when their text changed.
+    Snapshots can be skipped, since each of them holds the whole state of the game. A board can also be drawn
+    scaled down at any position of a larger canvas, as done by TiledViewer.
+
+    Attributes:
+        canvas (tkinter.Canvas): The canvas to draw on.
+        colors (tuple): The color of each snake and of its food.
+        origin (tuple): The canvas (x, y) position of the top-left corner of the board.
+        scale (float): Canvas pixels per board pixel.
+        boards (bool): Whether to draw the steps and score boards.
+        frames (int): The number of snapshots drawn.
+    """
+    def __init__(self, canvas, colors=('brown', 'green'), origin=(0, 0), scale=1, boards=True):
+        self.canvas = canvas
+        self.colors = colors
+        self.origin = origin
+        self.scale = scale
+        self.boards = boards
+        self.frames = 0
+        self._drawn = {}
+        self._items = None
+
+    def draw(self, snapshot):
+        """
+        Draws a snapshot of the game.
+        """
+        if self._items is None:
+            self._items = self.create_items(snapshot)
+        snakes, foods, boards = self._items
+
+        for blocks, positions in zip(snakes, snapshot.snakes):
+            self.draw_snake(blocks, positions)
+        for item, position in zip(foods, snapshot.foods):
+            self.move_item(item, position)
+        if boards:
+            self.set_text(boards[0], 'Steps : ' + str(snapshot.steps))
+            self.set_text(boards[1], 'Score : ' + str(snapshot.score))
+        self.frames += 1
+
+    def create_items(self, snapshot):
+        """
+        Creates the snakes, boards and food objects on the canvas, and returns their items.
+        """
+        size = UNIT_SIZE * self.scale
+        snakes = []
+        for id, (positions, color) in enumerate(zip(snapshot.snakes, self.colors), start=1):
+            (x0, y0), blocks = self.canvas_position(positions[0]), positions[1:]
+            items = [self.canvas.create_oval(
+                x0, y0, x0 + size, y0 + size,
+                fill='orange', outline='brown',
+                tags=('snake_' + str(id), 'head')
+            )]
+            for x0, y0 in map(self.canvas_position, blocks):
+                items.append(self.canvas.create_rectangle(
+                    x0, y0, x0 + size, y0 + size, fill=color, tags='snake_' + str(id)))
+            snakes.append(items)
+
+        boards = []
+        if self.boards:
+            y_offset = 0.02
+            for x_offset, board in ((0.15, "steps_board"), (0.85, "score_board")):
+                x0, y0 = self.canvas_position((x_offset * CANVAS_WIDTH, y_offset * CANVAS_HEIGHT))
+                boards.append(self.canvas.create_text(
+                    x0,
+                    y0,
+                    font=("Times", 12, 'bold'),
+                    fill='white',
+                    tags=board
+                ))
+
+        foods = []
+        for position, color in zip(snapshot.foods, self.colors):
+            x0, y0 = self.canvas_position(position)
+            foods.append(self.canvas.create_oval(x0, y0, x0 + size, y0 + size, fill=color, tags='food'))
+
+        for item, position in zip([item for items in snakes for item in items] + foods,
+                                  [position for positions in snapshot.snakes for position in positions] + list(snapshot.foods)):
+            self._drawn[item] = position
+        return snakes, foods, boards
+
+    def canvas_position(self, position):
+        """
+        Returns the canvas (x, y) position of a board position.
+        """
+        return self.origin[0] + position[0] * self.scale, self.origin[1] + position[1] * self.scale
+
+    def draw_snake(self, blocks, positions):
+        head, blocks = blocks[0], blocks[1:]
+        self.move_item(head, positions[0])
+
+        # blocks already drawn on a position of the body stay, the others fill the new positions
+        targets = set(positions[1:])
+        free_blocks = []
+        for block in blocks:
+            position = self._drawn.get(block)
+            if position is not None and position in targets:
+                targets.discard(position)
+            else:
+                free_blocks.append(block)
+        for block, position in zip(free_blocks, targets):
+            self.move_item(block, position)
+
+    def move_item(self, item, position):
+        if self._drawn.get(item) != position:
+            x0, y0 = self.canvas_position(position)
+            self.canvas.moveto(item, x0 - 1, y0 - 1)
+            self._drawn[item] = position
+
+    def set_text(self, item, text):
+        if self._drawn.get(item) != text:
+            self.canvas.itemconfig(item, text=text)
+            self._drawn[item] = text
+
+class GameViewer:
+    """
+    Plays a game in a worker thread and draws its snapshots on a canvas from the Tk event loop.
+
+    Only the worker touches the game, which publishes its snapshots to a SnapshotQueue; the viewer polls the
+    queue with `after` callbacks and draws the latest snapshot, so the window stays responsive however long
+    the agents take to plan, and the speed of the game does not depend on drawing. Closing the window stops
+    the game after the current step. Once the game is over, the window shows it for `linger` seconds and the
+    mainloop returns.
 
-        # move head
-        snake_head_tag = self.get_head_tag()
-        self.canvas.move(snake_head_tag, self.direction_x * UNIT_SIZE, self.direction_y * UNIT_SIZE)
+    Attributes:
+        root (tkinter.Tk): The root window of the game.
+        game (Game): The game to play, publishing to a SnapshotQueue.
+        renderer (CanvasRenderer): Draws the snapshots on the canvas.
+        poll_interval (int): Milliseconds between two polls of the queue.
+        welcome (float): Seconds the welcome message is shown before the game starts.
+        linger (float): Seconds the final state of the game stays on screen.
+    """
+    def __init__(self, root, canvas, game, poll_interval=10, welcome=0.5, linger=0):
+        self.root = root
+        self.canvas = canvas
+        self.game = game
+        self.renderer = CanvasRenderer(canvas)
+        self.poll_interval = poll_interval
+        self.welcome = welcome
+        self.linger = linger
+        self.error = None
+        self._thread = threading.Thread(target=self.simulate, name="game", daemon=True)
+
+    def run(self):
+        """
+        Plays the game, returning once it is over (or its window was closed).
 
-    def get_head_tag(self):
+        Returns:
+            bool: Whether the game was played until the end.
+        """
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        if self.welcome:
+            label = self.display_label('Welcome to the Snake World!')
+            self.root.after(round(self.welcome * 1000), lambda: (label.place_forget(), self.start()))
+        else:
+            self.start()
+        self.root.mainloop()
+
+        self.game.stop()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.game.game_over
+
+    def start(self):
+        self._thread.start()
+        self.root.after(self.poll_interval, self.poll)
+
+    def simulate(self):
+        try:
+            self.game.play_game()
+        except BaseException as error:
+            self.error = error
+
+    def poll(self):
         """
-        Returns the tag of the snake's head.
+        Draws the latest snapshot published, and stops polling once the game is over.
         """
-        return 'snake_' + str(self.id) + '&&head'
+        # checked first, so that the snapshots published before the game ended are all taken below
+        finished = not self._thread.is_alive()
+        snapshot = None
+        while True:
+            try:
+                snapshot = self.game.publisher.queue.get_nowait()
+            except queue.Empty:
+                break
+        if snapshot is not None:
+            self.renderer.draw(snapshot)
+
+        if not finished:
+            self.root.after(self.poll_interval, self.poll)
+        elif self.game.game_over:
+            self.display_label('Episode Over!')
+            self.root.after(round(self.linger * 1000), self.root.quit)
+        else:
+            self.root.quit()
+
+    def close(self):
+        """
+        Stops the game when its window is closed.
+        """
+        self.game.stop()
+        if not self._thread.is_alive():
+            self.root.quit()
+
+    def display_label(self, message):
+        """
+        Displays messages on the canvas.
+        """
+        import tkinter
+
+        widget = tkinter.Label(
+            self.canvas,
+            text=message,
+            fg='white',
+            bg='black',
+            font=("Times", 20, 'bold')
+        )
+        widget.place(relx=0.5, rely=0.5, anchor='center')
+        return widget
+
+class TiledViewer:
+    """
+    Draws the games played by parallel workers as a grid of mini-boards on a single canvas.
+
+    Each worker owns a tile and publishes its snapshots, at a low rate, to a queue shared by all workers (see
+    TilePublisher). Every poll drains the queue, keeps the latest snapshot of each tile and draws them all in
+    one pass, scaled down so that the grid fits in `width` pixels; a caption above each board shows its team,
+    episode, steps and score. Drawing only moves the items that changed, so a 64-way run costs a few hundred
+    canvas updates per poll at most.
+
+    Attributes:
+        root (tkinter.Tk): The root window of the viewer.
+        snapshots (multiprocessing.Queue): The (tile, title, snapshot) messages of the workers.
+        columns (int): The number of tiles per row.
+        scale (float): Canvas pixels per board pixel.
+        poll_interval (int): Milliseconds between two polls of the queues.
+        closed (bool): Whether the window was closed by the user.
+    """
+    CAPTION_HEIGHT = 14
+    MARGIN = 4
+
+    def __init__(self, root, n_tiles, snapshots, width=960, poll_interval=50):
+        import tkinter
+
+        self.root = root
+        self.snapshots = snapshots
+        self.poll_interval = poll_interval
+        self.closed = False
+        self.error = None
+        self.columns = math.ceil(math.sqrt(n_tiles))
+        rows = math.ceil(n_tiles / self.columns)
+        self.scale = min(1.0, width / (self.columns * (CANVAS_WIDTH + self.MARGIN)))
+        tile_width = CANVAS_WIDTH * self.scale + self.MARGIN
+        tile_height = CANVAS_HEIGHT * self.scale + self.CAPTION_HEIGHT + self.MARGIN
+
+        root.title('Snake Game - %d workers' % n_tiles)
+        self.canvas = tkinter.Canvas(root, width=self.columns * tile_width, height=rows * tile_height, bg='black')
+        self.canvas.pack(padx=10, pady=10)
+
+        self.renderers = []
+        self.captions = []
+        for tile in range(n_tiles):
+            x0 = (tile % self.columns) * tile_width + self.MARGIN / 2
+            y0 = (tile // self.columns) * tile_height + self.CAPTION_HEIGHT
+            self.canvas.create_rectangle(
+                x0, y0, x0 + CANVAS_WIDTH * self.scale, y0 + CANVAS_HEIGHT * self.scale, outline='gray30')
+            self.captions.append(self.canvas.create_text(
+                x0, y0 - self.CAPTION_HEIGHT / 2, anchor='w', font=("Times", 8), fill='white'))
+            self.renderers.append(CanvasRenderer(self.canvas, origin=(x0, y0), scale=self.scale, boards=False))
+
+    def run(self, collect):
+        """
+        Draws the snapshots of the workers until `collect`, called at every poll, returns True.
+
+        Returns:
+            bool: False if the window was closed before that.
+        """
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        self.root.after(self.poll_interval, self.poll, collect)
+        self.root.mainloop()
+        if self.error is not None:
+            raise self.error
+        return not self.closed
+
+    def poll(self, collect):
+        latest = {}
+        while True:
+            try:
+                tile, title, snapshot = self.snapshots.get_nowait()
+            except queue.Empty:
+                break
+            latest[tile] = (title, snapshot)
+
+        for tile, (title, snapshot) in latest.items():
+            renderer = self.renderers[tile]
+            renderer.draw(snapshot)
+            renderer.set_text(self.captions[tile], f"{title}  {snapshot.steps} / {snapshot.score}")
+
+        try:
+            finished = collect()
+        except BaseException as error:
+            # tkinter would only print errors raised in callbacks, and keep the window open
+            self.error = error
+            finished = True
+        if finished:
+            self.root.quit()
+        else:
+            self.root.after(self.poll_interval, self.poll, collect)
+
+    def close(self):
+        self.closed = True
+        self.root.quit()
 
 class Game:
     """
     Represents the game environment.
 
+    The game only holds the model (the positions of the snakes and food objects): views draw it from the
+    snapshots it publishes, so it can be played in any thread, or without any window.
+
     Attributes:
-        root (tkinter.Tk): The root window of the game.
-        canvas (tkinter.Canvas): The canvas on which the game objects are displayed.
         snake1 (Snake): The first snake in the game.
         snake2 (Snake): The second snake in the game.
-        food1 (int): The ID of the first food object (targeted by snake 1).
-        food2 (int): The ID of the second food object (targeted by snake 2).
+        food1 (list): The [x, y] position of the first food object (targeted by snake 1).
+        food2 (list): The [x, y] position of the second food object (targeted by snake 2).
         steps (int): The number of steps taken in the game.
         score (int): The score of the game.
         game_over (bool): Indicates whether the game is over or not.
+        publisher (SnapshotQueue): If given, receives snapshots of the game for a view.
+        metrics (Metrics): If given, receives the duration of each phase of every step.
+        history (list): If recording, the positions of the snakes and food objects at every step.
     """
-    def __init__(self, root, snakes, canvas):
-        self.root = root
-        self.canvas = canvas
+    def __init__(self, snakes, publisher=None, metrics=None, record=False):
         self.snake1 = snakes[0]
         self.snake2 = snakes[1]
+        self.publisher = publisher
+        self.metrics = metrics
+        self.history = [] if record else None
         
-        self.food1 = 0
-        self.food2 = 0
+        self.food1 = None
+        self.food2 = None
         self.steps = 0
         self.score = 0
         self.game_over = False
-        self.create_boards()
-        self.play_game()
+        self.stopped = False
         
     def get_results(self):
         """
@@ -250,42 +580,13 @@ class Game:
 
         return [self.steps, self.score, death]
 
-    def create_boards(self):
+    def random_food_position(self):
         """
-        Positions score and steps boards on the canvas
-        """
-        y_offset = 0.02
-        self.canvas.create_text(
-            0.15 * CANVAS_WIDTH, 
-            y_offset * CANVAS_HEIGHT,
-            text=('Steps : ' + str(self.steps)), 
-            font=("Times", 12, 'bold'), 
-            fill='white',
-            tags='steps_board'
-        )
-        self.canvas.create_text(
-            0.85 * CANVAS_WIDTH, 
-            y_offset * CANVAS_HEIGHT,
-            text=('Score : ' + str(self.score)), 
-            font=("Times", 12, 'bold'), 
-            fill='white',
-            tags='score_board'
-        )
-
-    def place_food(self, color):
-        """
-        Randomly places a circular 'food' object anywhere on the canvas.
-        
-        Args:
-            color (str): The color of the food object.
-        
-        Returns:
-            tuple: A tuple containing the ID of the created food object and its position as [x, y].
+        Returns a random [x, y] position for a food object.
         """
         x1 = random.randrange(2*UNIT_SIZE, CANVAS_WIDTH - UNIT_SIZE, step=UNIT_SIZE)
         y1 = random.randrange(2*UNIT_SIZE, CANVAS_HEIGHT - UNIT_SIZE, step=UNIT_SIZE)
-        id = self.canvas.create_oval(x1, y1, x1 + UNIT_SIZE, y1 + UNIT_SIZE, fill= color, tags='food')
-        return id, [x1, y1]
+        return [x1, y1]
     
     def move_snake(self, snake):
         """
@@ -294,46 +595,37 @@ class Game:
         direction = snake.agent.move_direction()
         snake.move(direction)
 
-    def update_score_board(self):
-        """
-        Updates score and steps boards in the canvas
-        """
-        self.canvas.itemconfig("score_board", text='Score : ' + str(self.score))
-        self.canvas.itemconfig("steps_board", text='Steps : ' + str(self.steps))
-
     def snake_check(self, snake):
         """
         Handles events during the snake's motion.
         Checks for collisions with food, wall, self or other snakes.
         """
-        snake_head_tag = snake.get_head_tag()
-        x0, y0, x1, y1 = self.canvas.coords(snake_head_tag)
+        head = snake.positions[0]
+        x0, y0 = head
+        x1, y1 = x0 + UNIT_SIZE, y0 + UNIT_SIZE
 
         if (x0 <= 0) or (y0 <= 0) or (x1 >= CANVAS_WIDTH) or (y1 >= CANVAS_HEIGHT):
             snake.death = "WALL"
 
-        overlapping_objects = self.canvas.find_overlapping(x0+1, y0+1, x1-1, y1-1)
-        for obj in overlapping_objects:
-            overlapping_object_tags = self.canvas.gettags(obj)
-            if 'food' in overlapping_object_tags:
-                self.handle_hit_food(obj, snake)
-                break
-            elif 'snake_'+str(snake.id) in overlapping_object_tags:
-                if "head" not in overlapping_object_tags:
+        # snakes are checked in the order their blocks were drawn, so the last collision found wins
+        for other in (self.snake1, self.snake2):
+            if other is snake:
+                if head in snake.positions[1:]:
                     snake.death = "SELF"
-            elif 'snake_' in str(overlapping_object_tags):
+            elif head in other.positions:
                 snake.death = "SNAKE"
 
-    def handle_hit_food(self, food_id, snake):
+        self.handle_hit_food(snake)
+
+    def handle_hit_food(self, snake):
         """
         Handles the event when a snake hits a food object. 
-        If it is the snakes targeted food, deletes current food and creates a new one.
+        If it is the snakes targeted food, places it somewhere else.
         """
-        if (snake.food == food_id):
-            self.canvas.delete(food_id)
+        food = self.food1 if snake.id == 1 else self.food2
+        if snake.positions[0] == food:
             self.score += 1
-            new_id, position = self.place_food(snake.color)
-            snake.new_food(new_id)
+            position = self.random_food_position()
             if (snake.id == 1):
                 self.food1 = position
             else:
@@ -346,7 +638,6 @@ class Game:
         """
         self.snake_check(self.snake1)
         self.snake_check(self.snake2)
-        self.update_score_board()
         if self.snake1.death or self.snake2.death:
             self.game_over=True
         elif self.steps == MAX_STEPS:
@@ -360,31 +651,24 @@ class Game:
         print("\n\nEpisode Over!")
         print(f"\nSteps: {self.steps} \nScore: {self.score} \nCase of death snake 1: {self.snake1.death} \nCase of death snake 2: {self.snake2.death} "
         )
-        widget = tkinter.Label(
-            self.canvas, 
-            text='Episode Over!',
-            fg='white', bg='black', 
-            font=("Times", 20, 'bold'
-        ))
-        widget.pack()
-        widget.place(relx=0.5, rely=0.5, anchor='center')       
 
-    def display_label(self, message, display_time):
+    def snapshot(self):
         """
-        Displays messages on the canvas.
+        Returns an immutable Snapshot of the current state of the game.
         """
-        widget = tkinter.Label(
-            self.canvas, 
-            text=message, 
-            fg='white', 
-            bg='black',
-            font=("Times", 20, 'bold')
+        return Snapshot(
+            self.steps,
+            self.score,
+            tuple(tuple(tuple(position) for position in snake.positions) for snake in (self.snake1, self.snake2)),
+            (tuple(self.food1), tuple(self.food2)),
+            self.game_over,
         )
-        widget.place(relx=0.5, rely=0.5, anchor='center')
-        self.canvas.update()
-        time.sleep(display_time)
-        widget.place_forget()
-        self.canvas.update()  
+
+    def stop(self):
+        """
+        Stops the game after the current step.
+        """
+        self.stopped = True
 
     def get_snake_positions(self):
         """
@@ -409,6 +693,7 @@ class Game:
             tuple: A tuple containing the positions of the snakes and food objects, rewards for each snake,
                 and a boolean indicating if the game is over.
         """
+        start = time.perf_counter()
         if (self.snake1.communicates and len(self.snake1.agent.intention) == 0):
             intention = self.snake1.agent.make_new_intention()
             self.snake2.agent.receive_intention(intention)
@@ -420,14 +705,26 @@ class Game:
         self.move_snake(self.snake1)
         self.move_snake(self.snake2)
         self.steps+=1
-        self.canvas.update()
+        moved = time.perf_counter()
         self.update_game()
+        checked = time.perf_counter()
+        if self.publisher is not None:
+            self.publisher.publish(self)
+        published = time.perf_counter()
 
         snakes_pos = self.get_snake_positions()
         food_pos = self.get_food_positions()
         positions = [snakes_pos, food_pos]
         rewards = [0, 0]
 
+        if self.metrics is not None:
+            self.metrics.step([
+                ("move", moved - start),
+                ("check", checked - moved),
+                ("publish", published - checked),
+                ("observe", time.perf_counter() - published),
+            ])
+
         done = self.game_over
         return positions, rewards, done
 
@@ -435,20 +732,14 @@ class Game:
         """
         Resets the game to its initial state.
 
-        Creates new food objects, updates the snake's food IDs and positions,
-        and retrieves the positions of the snakes and food objects.
+        Places the food objects and retrieves the positions of the snakes and food objects.
 
         Returns:
             tuple: A tuple containing the positions of the snakes and food objects, rewards for each snake,
                 and a boolean indicating if the game is over.
         """
-        id1, food1 = self.place_food('brown')
-        id2, food2 = self.place_food('green')
-
-        self.food1 = food1
-        self.food2 = food2
-        self.snake1.new_food(id1)
-        self.snake2.new_food(id2)
+        self.food1 = self.random_food_position()
+        self.food2 = self.random_food_position()
 
         snakes_pos = self.get_snake_positions()
         food_pos = self.get_food_positions()
@@ -460,18 +751,329 @@ class Game:
 
     def play_game(self):
         """
-        Plays the game until one of the snakes dies or the maximum number of steps is reached.
+        Plays the game until one of the snakes dies, the maximum number of steps is reached or it is stopped.
         """
-        self.display_label('Welcome to the Snake World!', 0.5)
-        
         observation = self.reset()
-        while not self.game_over:
+        realtime = self.publisher is not None and self.publisher.realtime
+        if self.publisher is not None:
+            self.publisher.publish(self, force=True)
+        while not self.game_over and not self.stopped:
+            if self.history is not None:
+                self.history.append(observation[0])
             # move snakes and update game
             self.snake1.agent.see(observation)
             self.snake2.agent.see(observation)
             observation = self.step()
-            time.sleep(1/SPEED)
-        self.handle_episode_over()
+            if realtime:
+                time.sleep(1/SPEED)
+        if self.history is not None:
+            self.history.append(observation[0])
+        if self.publisher is not None:
+            self.publisher.publish(self, force=True)
+        if self.game_over:
+            self.handle_episode_over()
+
+def play_episodes(team_name, agents, episodes, stats, ghost, debug, seed=None, store=None, metrics=None, memory=None, make_publisher=SnapshotQueue, videos=None, completed=None):
+    """
+    Plays the given episodes with a team, a new window per episode (none in ghost mode), and adds their results to `stats`.
+
+    Args:
+        team_name (str): The name of the team.
+        agents (str): The agent type of the team.
+        episodes (range): The indices of the episodes to play.
+        stats (TeamStats): The statistics the results are added to.
+        ghost (bool): Whether to play without game windows.
+        debug (bool): A flag indicating whether debug mode is enabled or not.
+        seed (int): If given, episode i is played with seed `seed + i`.
+        store (ResultsStore): If given, the result of every episode is appended to it.
+        metrics (Metrics): If given, receives live step and episode metrics.
+        memory (MemoryMonitor): If given, records memory use after every episode.
+        make_publisher (callable): Creates the SnapshotQueue each game publishes to for its window.
+        videos (VideoExporter): If given, every episode is recorded and offered for export.
+        completed (dict): Maps (team_name, episode) to the (seed, result) of the episodes already played (e.g.
+            before an interruption), which are added to `stats` instead of being played again.
+    """
+    from tqdm import tqdm
+
+    for episode in tqdm(episodes, desc="Episode", position=0):
+        if completed and (team_name, episode) in completed:
+            stats.push(completed[team_name, episode][1])
+            continue
+
+        # Every episode is seeded, and the seed recorded, so that any of them can be replayed
+        episode_seed = seed + episode if seed is not None else random.randrange(2 ** 31)
+        random.seed(episode_seed)
+        np.random.seed(episode_seed)
+        start = time.perf_counter()
+
+        team = create_team(agents, debug)
+        if ghost:
+            # Without a window the game is simply played here, at full speed
+            run = Game(team, metrics=metrics, record=videos is not None)
+            run.play_game()
+            if memory is not None:
+                memory.episode_end()
+        else:
+            # Create a new root and canvas for each episode, the game is played in a worker thread
+            import tkinter
+
+            new_root = tkinter.Tk()
+            new_canvas = make_canvas(CANVAS_WIDTH, CANVAS_HEIGHT, 'Snake Game', new_root)
+            run = Game(team, make_publisher(), metrics, record=videos is not None)
+            finished = GameViewer(new_root, new_canvas, run).run()
+            new_root.destroy()
+            if memory is not None:
+                # The canvas is destroyed with its window, so only the memory of the process can leak
+                memory.episode_end()
+            if not finished:
+                raise KeyboardInterrupt("The game window was closed")
+        result = run.get_results()
+        if debug:
+            print(result)
+        stats.push(result)
+        if metrics is not None:
+            metrics.episode(team_name)
+        if videos is not None:
+            videos.offer(team_name, episode, result, run.history)
+        if store is not None:
+            store.add(team_name, [agents, agents], episode_seed, episode, result, time.perf_counter() - start)
+
+
+def play_tournament(teams, n_episodes, ghost, debug, seed=None, store=None, budget=None, metrics=None, memory=None, make_publisher=SnapshotQueue, videos=None, completed=None):
+    """
+    Plays `n_episodes` episodes with each of the given teams.
+
+    Args:
+        teams (dict): Maps each team name to its agent type.
+        n_episodes (int): Number of episodes per team (the minimum number when `budget` is given).
+        ghost (bool): Whether to play without game windows.
+        debug (bool): A flag indicating whether debug mode is enabled or not.
+        seed (int): If given, episode i of each team is played with seed `seed + i`.
+        store (ResultsStore): If given, the result of every episode is appended to it.
+        budget (AdaptiveBudget): If given, keeps adding episodes to the teams whose ranking is unresolved.
+        metrics (Metrics): If given, receives live step and episode metrics.
+        memory (MemoryMonitor): If given, records memory use after every episode.
+        make_publisher (callable): Creates the SnapshotQueue each game publishes to for its window.
+        videos (VideoExporter): If given, receives every episode for export.
+        completed (dict): Maps (team_name, episode) to the (seed, result) of the episodes already played, which
+            are not played again.
+
+    Returns:
+        list: The TeamStats of each team, in the order of `teams`.
+    """
+    from tqdm import tqdm
+
+    # Results are folded into constant-size running statistics as episodes finish
+    teams = list(teams.items())
+    team_stats = [TeamStats() for _ in teams]
+    for (team_name, agents), stats in tqdm(zip(teams, team_stats), desc="Agent", total=len(teams), leave=True):
+        play_episodes(team_name, agents, range(n_episodes), stats, ghost, debug, seed, store, metrics, memory, make_publisher, videos, completed)
+
+    if budget is not None:
+        extra_episodes = budget.next_episodes(team_stats)
+        while extra_episodes:
+            for team, n in extra_episodes.items():
+                (team_name, agents), stats = teams[team], team_stats[team]
+                play_episodes(team_name, agents, range(stats.n, stats.n + n), stats, ghost, debug, seed, store, metrics, memory, make_publisher, videos, completed)
+            extra_episodes = budget.next_episodes(team_stats)
+        if debug:
+            print("Episodes per team: ", [stats.n for stats in team_stats])
+
+    if videos is not None:
+        for team_name, _ in teams:
+            videos.finish_team(team_name)
+
+    return team_stats
+
+
+def play_parallel(teams, n_episodes, n_workers, ghost, debug, seed=None, store=None, budget=None, metrics=None, memory=None, videos=None, fps=10, completed=None):
+    """
+    Plays `n_episodes` episodes with each of the given teams, spread across `n_workers` processes.
+
+    The workers play whole episodes (seeded as in play_tournament, so the results are the same) and send
+    their results back to this process, which folds them into the statistics of the teams as they arrive.
+    Unless in ghost mode, the games of all workers are shown live in a single TiledViewer window.
+
+    Args:
+        teams (dict): Maps each team name to its agent type.
+        n_episodes (int): Number of episodes per team (the minimum number when `budget` is given).
+        n_workers (int): Number of worker processes.
+        ghost (bool): Whether to play without the viewer window.
+        debug (bool): A flag indicating whether debug mode is enabled or not.
+        seed (int): If given, episode i of each team is played with seed `seed + i`.
+        store (ResultsStore): If given, the result of every episode is appended to it.
+        budget (AdaptiveBudget): If given, keeps adding episodes to the teams whose ranking is unresolved.
+        metrics (Metrics): If given, receives live episode metrics and the depth of the results queue.
+        memory (MemoryMonitor): If given, records the memory use of this process (the workers are not traced)
+            and the items on the viewer's canvas, which lives as long as the run, after every episode.
+        videos (VideoExporter): If given, receives every episode for export.
+        fps (float): Snapshots per second published by each worker to the viewer.
+        completed (dict): Maps (team_name, episode) to the (seed, result) of the episodes already played, which
+            are not played again.
+
+    Returns:
+        list: The TeamStats of each team, in the order of `teams`.
+    """
+    from tqdm import tqdm
+
+    teams = list(teams.items())
+    team_stats = [TeamStats() for _ in teams]
+
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    snapshots = None if ghost else multiprocessing.Queue(maxsize=4 * n_workers)
+    workers = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(worker_id, tasks, results, snapshots, debug, fps, videos is not None, metrics is not None), daemon=True)
+        for worker_id in range(n_workers)
+    ]
+    # Started before any window is created, so that the forked workers do not inherit tkinter's state
+    for worker in workers:
+        worker.start()
+
+    progress = tqdm(desc="Episode", total=0)
+    pending = 0
+    viewer = None
+
+    def schedule(episodes):
+        # episodes maps team indices to the episodes to play
+        nonlocal pending
+        for team, team_episodes in episodes.items():
+            for episode in team_episodes:
+                if completed and (teams[team][0], episode) in completed:
+                    team_stats[team].push(completed[teams[team][0], episode][1])
+                    continue
+                episode_seed = seed + episode if seed is not None else random.randrange(2 ** 31)
+                tasks.put((team, teams[team][0], teams[team][1], episode, episode_seed))
+                pending += 1
+                progress.total += 1
+        progress.refresh()
+
+        if pending == 0 and budget is not None:
+            extra_episodes = budget.next_episodes(team_stats)
+            if extra_episodes:
+                schedule({team: range(team_stats[team].n, team_stats[team].n + n) for team, n in extra_episodes.items()})
+
+    def handle(reply):
+        nonlocal pending
+        team, episode, episode_seed, result, duration, history, step_totals, error = reply
+        if error is not None:
+            raise RuntimeError(f"Worker failed on episode {episode} of {teams[team][0]}:\n{error}")
+        team_name, agents = teams[team]
+        pending -= 1
+        progress.update()
+        if debug:
+            print(result)
+        team_stats[team].push(result)
+        if metrics is not None:
+            # The steps were played, and timed, in the worker
+            metrics.add_steps(*step_totals)
+            metrics.episode(team_name)
+        if memory is not None:
+            memory.episode_end([viewer.canvas] if viewer is not None else [])
+        if videos is not None:
+            videos.offer(team_name, episode, result, history)
+        if store is not None:
+            store.add(team_name, [agents, agents], episode_seed, episode, result, duration)
+
+        if pending == 0:
+            # the next round of the budget, if any
+            schedule({})
+
+    def report_queue_depth():
+        if metrics is not None:
+            try:
+                metrics.queue_depth(results.qsize())
+            except NotImplementedError:
+                pass
+
+    def collect():
+        # Handles the results received so far, returns True once every episode was played
+        while pending > 0:
+            try:
+                reply = results.get_nowait()
+            except queue.Empty:
+                break
+            handle(reply)
+        report_queue_depth()
+        return pending == 0
+
+    try:
+        schedule({team: range(n_episodes) for team in range(len(teams))})
+        if ghost:
+            while pending > 0:
+                handle(results.get())
+                report_queue_depth()
+        else:
+            import tkinter
+
+            root = tkinter.Tk()
+            viewer = TiledViewer(root, n_workers, snapshots)
+            finished = viewer.run(collect)
+            root.destroy()
+            if not finished:
+                raise KeyboardInterrupt("The viewer window was closed")
+    finally:
+        progress.close()
+        if pending > 0:
+            # interrupted, the episodes left are not played (nor sent to the workers)
+            tasks.cancel_join_thread()
+            for worker in workers:
+                worker.terminate()
+        else:
+            for _ in workers:
+                tasks.put(None)
+        # The results were all received, and the workers drop the snapshots the viewer did not draw (see
+        # run_worker), so no worker is left waiting to flush a queue
+        for worker in workers:
+            worker.join()
+
+    if debug and budget is not None:
+        print("Episodes per team: ", [stats.n for stats in team_stats])
+    if videos is not None:
+        for team_name, _ in teams:
+            videos.finish_team(team_name)
+
+    return team_stats
+
+
+def run_worker(worker_id, tasks, results, snapshots, debug, fps, record, measure=False):
+    """
+    Worker loop of the parallel mode: plays episodes until it receives None.
+
+    With `measure`, every result comes with the step totals of its episode (see Metrics.step_totals), which the
+    main process adds to its own metrics.
+    """
+    import traceback
+    import tracemalloc
+
+    if snapshots is not None:
+        # Snapshots are only worth drawing while the viewer is open, the worker may exit with some unsent
+        snapshots.cancel_join_thread()
+
+    if tracemalloc.is_tracing():
+        # Inherited from a coordinator started with --memory-check, which only monitors its own memory
+        tracemalloc.stop()
+
+    for team, team_name, agents, episode, episode_seed in iter(tasks.get, None):
+        random.seed(episode_seed)
+        np.random.seed(episode_seed)
+        start = time.perf_counter()
+        publisher = None
+        if snapshots is not None:
+            publisher = TilePublisher(snapshots, worker_id, f"{team_name} #{episode + 1}", fps=fps)
+        metrics = Metrics() if measure else None
+        game = Game(create_team(agents, debug), publisher, metrics, record=record)
+        try:
+            game.play_game()
+        except Exception:
+            results.put((team, episode, episode_seed, None, 0.0, None, None, traceback.format_exc()))
+            continue
+        results.put((
+            team, episode, episode_seed, game.get_results(), time.perf_counter() - start, game.history,
+            metrics.step_totals() if measure else None, None))
+
 
 def main():
     # Parse command-line arguments
@@ -480,82 +1082,172 @@ def main():
     parser.add_argument("--agents", default="")
     parser.add_argument("--debug", default="")
     parser.add_argument("--ghost", default="")
+    parser.add_argument("--profile-imports", default="")
+    parser.add_argument("--report-dir", default="")
+    parser.add_argument("--sweeps", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--results-db", default="")
+    parser.add_argument("--adaptive", default="", choices=["", "steps", "score", "efficiency"])
+    parser.add_argument("--max-episodes", type=int, default=200)
+    parser.add_argument("--metrics-port", type=int, default=0)
+    parser.add_argument("--memory-check", default="")
+    parser.add_argument("--memory-threshold", type=float, default=64)
+    parser.add_argument("--render-every", type=int, default=1)
+    parser.add_argument("--fps", type=float, default=0)
+    parser.add_argument("--video-dir", default="")
+    parser.add_argument("--video-format", default="gif", choices=["gif", "mp4"])
+    parser.add_argument("--video-every", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--resume", default="")
+    parser.add_argument("--checkpoint-every", type=int, default=1)
     opt = parser.parse_args()
+    if opt.resume and not opt.results_db:
+        parser.error("--resume needs the --results-db the run was stored in")
+    if opt.render_every < 1:
+        parser.error("--render-every must be at least 1")
+
+    if opt.profile_imports == "true":
+        time_imports()
+        atexit.register(report_imports)
 
     debug = False
     if opt.debug == "true":
         debug = True
+    ghost = bool(opt.ghost)
+
+    # Skipping frames (or drawing at a fixed rate) also lets the simulation run at full speed
+    make_publisher = functools.partial(SnapshotQueue, every=opt.render_every, fps=opt.fps or None)
     
     if opt.agents == "all":
         print("Compare results for different teams")
 
         teams = { "Random team": "random", "Fully Greedy team": "fully_greedy", "Partially Greedy team": "part_greedy", "Social Convention Team" : "social_convention", "Intention Communication Team" : "intention_comm"}
     
-        results = []
-        for team, agents in tqdm(teams.items(), desc="Agent", leave=True):
-            team_results = []
-            for episode in tqdm(range(opt.episodes), desc="Episode", position=0):
-                # Create a new root and canvas for each episode
-                new_root = tkinter.Tk()
-                if opt.ghost: 
-                    new_root.withdraw()
-                new_canvas = make_canvas(CANVAS_WIDTH, CANVAS_HEIGHT, 'Snake Game', new_root)
-
-                team = create_team(agents, new_canvas, debug)
-
-                run = Game(new_root, team, new_canvas)
-                result = run.get_results()
-                new_root.destroy()
-                if debug:
-                    print(result)
-                team_results += [result]
-            
-            results += [team_results]
-        if debug:
-            print("Results: ", results)
-        
-        # Analyze and compare the results
-        results = results_by_type(results)
         colors=["orange", "green", "blue", "red", "black"]
 
-        compare_results(
-            results[0],
-            title="Average Steps Comparison",
-            colors=colors,
-            metric="Steps per Episode"
-        ) 
-
-        compare_results(
-            results[1],
-            title="Average Score Comparison",
-            colors=colors,
-            metric="Score per Episode"
-        )
-
-        compare_results(
-            results[2],
-            title="Score Efficiency Comparison",
-            colors=colors,
-            metric="Score/Steps per Episode"
-        )
-
-
-        plot_deaths(
-            results[3],
-            colors=colors,
-        )
+        reports = ReportWriter() if opt.report_dir else None
+        store = None
+        if opt.results_db:
+            # Every episode is stored once it is over (by default), so that an interrupted run can be resumed
+            store = ResultsStore(opt.results_db, run_id=opt.resume or None, batch_size=opt.checkpoint_every)
+            run_id = store.run_id
+            run_ids = [run_id] if opt.sweeps == 1 else [f"{run_id}-sweep{sweep + 1}" for sweep in range(opt.sweeps)]
+            if opt.resume:
+                # Stored runs are seeded, so that resuming them plays the same episodes
+                seeds = {seed - episode for (_, episode), (seed, _) in store.completed(run_ids[0]).items()}
+                error = None
+                if not seeds:
+                    error = f"--resume: there is no run {opt.resume} in {opt.results_db}"
+                elif len(seeds) > 1:
+                    error = f"--resume: the episodes of run {opt.resume} were not seeded, it cannot be resumed"
+                elif opt.seed is not None and opt.seed not in seeds:
+                    error = f"--resume: run {opt.resume} was played with --seed {seeds.pop()}, not {opt.seed}"
+                if error is not None:
+                    store.close()
+                    parser.error(error)
+                opt.seed = seeds.pop()
+            elif opt.seed is None:
+                opt.seed = random.randrange(2 ** 31)
+            print(f"{'Resuming' if opt.resume else 'Storing'} run {run_id} (seed {opt.seed}) in {opt.results_db}")
+        budget = AdaptiveBudget(opt.adaptive, max_episodes=opt.max_episodes) if opt.adaptive else None
+        metrics = None
+        if opt.metrics_port:
+            metrics = Metrics()
+            host, port = metrics.serve(opt.metrics_port)
+            print(f"Serving metrics on http://{host}:{port}/metrics")
+        videos = None
+        if opt.video_dir:
+            videos = VideoExporter(
+                opt.video_dir, (CANVAS_WIDTH, CANVAS_HEIGHT, UNIT_SIZE), opt.video_format, SPEED, opt.video_every)
+        memory = None
+        if opt.memory_check == "true":
+            memory = MemoryMonitor(max_bytes_per_episode=opt.memory_threshold * 1024)
+            memory.start()
+        # Sweeps play different episodes, still reproducible from --seed: each one gets a range of seeds as
+        # wide as the number of episodes a team may play, extra adaptive episodes included
+        sweep_episodes = max(opt.episodes, opt.max_episodes) if budget is not None else opt.episodes
+        try:
+            for sweep in range(opt.sweeps):
+                seed = opt.seed + sweep * sweep_episodes if opt.seed is not None else None
+                completed = None
+                if store is not None:
+                    store.run_id = run_ids[sweep]
+                    completed = store.completed() if opt.resume else None
+                if videos is not None and (store is not None or opt.sweeps > 1):
+                    # The videos of every run and sweep go to the same directory
+                    videos.run_id = run_ids[sweep] if store is not None else f"sweep{sweep + 1}"
+                if opt.workers > 1:
+                    team_stats = play_parallel(
+                        teams, opt.episodes, opt.workers, ghost, debug, seed, store, budget, metrics, memory, videos,
+                        opt.fps or 10, completed)
+                else:
+                    team_stats = play_tournament(
+                        teams, opt.episodes, ghost, debug, seed, store, budget, metrics, memory, make_publisher, videos,
+                        completed)
+                if debug:
+                    print("Results: ", team_stats)
+
+                if reports is not None:
+                    # Charts are rendered to files in the background while the next sweep plays
+                    output_dir = opt.report_dir if opt.sweeps == 1 else os.path.join(opt.report_dir, f"sweep-{sweep + 1}")
+                    reports.submit(output_dir, teams.keys(), team_stats, colors)
+                    continue
+
+                # Analyze and compare the results
+                compare_stats(
+                    [stats.steps for stats in team_stats],
+                    title="Average Steps Comparison",
+                    colors=colors,
+                    metric="Steps per Episode"
+                ) 
+
+                compare_stats(
+                    [stats.score for stats in team_stats],
+                    title="Average Score Comparison",
+                    colors=colors,
+                    metric="Score per Episode"
+                )
+
+                compare_stats(
+                    [stats.efficiency for stats in team_stats],
+                    title="Score Efficiency Comparison",
+                    colors=colors,
+                    metric="Score/Steps per Episode"
+                )
+
+
+                plot_death_counts(
+                    [stats.death_counts() for stats in team_stats],
+                    colors=colors,
+                )
+        finally:
+            if store is not None:
+                # Also writes the buffered episodes of an interrupted run, so that it can be resumed
+                store.close()
+
+        if store is not None:
+            print(f"Stored the results of run {run_id} in {opt.results_db}")
+        if reports is not None:
+            files = reports.close()
+            print(f"Wrote {len(files)} report files to {opt.report_dir}")
+        if videos is not None:
+            files = videos.close()
+            print(f"Wrote {len(files)} videos to {opt.video_dir}")
+        if memory is not None and not memory.report():
+            sys.exit(1)
 
     else:
-        # Create a root and canvas for a single-team game
-        root = tkinter.Tk()
-        canvas = make_canvas(CANVAS_WIDTH, CANVAS_HEIGHT, 'Snake Game', root)
-        if opt.ghost:
-            root.withdraw()
-        team = create_team(opt.agents, canvas, debug)
-        run = Game(root, team, canvas)
-        if opt.ghost:
+        team = create_team(opt.agents, debug)
+        if ghost:
+            Game(team).play_game()
+        else:
+            # Create a root and canvas for a single-team game, which closes a moment after the game is over
+            import tkinter
+
+            root = tkinter.Tk()
+            canvas = make_canvas(CANVAS_WIDTH, CANVAS_HEIGHT, 'Snake Game', root)
+            GameViewer(root, canvas, Game(team, make_publisher()), linger=2).run()
             root.destroy()
-        root.mainloop()
         
 
 if __name__ == '__main__':
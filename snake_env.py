@@ -0,0 +1,159 @@
+import gym
+import numpy as np
+from gym import spaces
+
+from encoders import MOVES
+from render import BoardRasterizer
+
+ENV_ID = "CooperativeSnake-v0"
+
+# Named as in agents.py
+ACTION_MEANING = {
+    0: "DOWN",
+    1: "UP",
+    2: "RIGHT",
+    3: "LEFT",
+}
+
+
+class SnakeEnv(gym.Env):
+
+    """
+    Headless version of the cooperative 2-snake game of snake-game-rl.py, following the Gym API.
+
+    The board is simulated on plain coordinate lists (in pixels, with the same units, walls, food
+    placement and rewards as the tkinter Game), so it needs no window and runs at full speed.
+
+    Actions are one move per snake, in the order of the agents' actions (see Agent.move_direction).
+    Observations are the head positions of every snake followed by the position of every food,
+    as an integer array [x1, y1, x2, y2, food_x1, food_y1, food_x2, food_y2].
+    The reward is the team reward, i.e. the sum of the rewards of both snakes: +10 for eating its food,
+    -50 for hitting a wall or a snake and -0.5 otherwise. The episode terminates when a snake dies
+    and is truncated after `max_steps` steps.
+
+    With render_mode="rgb_array", render() paints the board offscreen into a NumPy frame.
+    """
+
+    metadata = {"render_modes": ["rgb_array"], "render_fps": 15}
+
+    def __init__(self, width=50, height=50, unit_size=10, n_agents=2, snake_size=1, max_steps=1000, render_mode=None):
+        self.width = width
+        self.height = height
+        self.unit_size = unit_size
+        self.n_agents = n_agents
+        self.n_food = n_agents
+        self.snake_size = snake_size
+        self._max_steps = max_steps
+
+        self._food_reward = 10
+        self._death_reward = -50
+        self._step_reward = -0.5
+
+        self.action_space = spaces.MultiDiscrete([len(MOVES)] * n_agents)
+        n_positions = 2 * (n_agents + self.n_food)
+        self.observation_space = spaces.Box(
+            low=-unit_size, high=max(width, height), shape=(n_positions,), dtype=np.int64)
+
+        self.snakes = None
+        self.foods = None
+        self.deaths = None
+        self.steps = 0
+        self.score = 0
+
+        self.render_mode = render_mode
+        self._rasterizer = BoardRasterizer(width, height, unit_size) if render_mode == "rgb_array" else None
+
+    def reset(self, *, seed=None, options=None):
+        super(SnakeEnv, self).reset(seed=seed)
+
+        # Snakes start in separate rows, heading right, fully inside the walls
+        n_rows = self.height // self.unit_size
+        self.snakes = []
+        for snake_id in range(1, self.n_agents + 1):
+            y = (snake_id * n_rows // (self.n_agents + 1)) * self.unit_size
+            head_x = self.snake_size * self.unit_size
+            self.snakes.append([[head_x - block * self.unit_size, y] for block in range(self.snake_size)])
+
+        self.foods = [self._place_food() for _ in range(self.n_food)]
+        self.deaths = [None] * self.n_agents
+        self.steps = 0
+        self.score = 0
+
+        return self._observation(), self._info()
+
+    def step(self, action):
+        for snake, move in zip(self.snakes, MOVES[np.asarray(action)]):
+            head = [snake[0][0] + move[0] * self.unit_size, snake[0][1] + move[1] * self.unit_size]
+            snake[:] = [head] + snake[:-1]
+        self.steps += 1
+
+        rewards = [self._check(snake_id) for snake_id in range(self.n_agents)]
+
+        terminated = any(death is not None for death in self.deaths)
+        truncated = not terminated and self.steps >= self._max_steps
+        return self._observation(), float(sum(rewards)), terminated, truncated, self._info()
+
+    def render(self):
+        """
+        Returns the current frame as a (height x width x 3) uint8 array when created with
+        render_mode="rgb_array" (the array is reused between calls), None otherwise.
+        """
+        if self._rasterizer is None:
+            return None
+        return self._rasterizer.render(self.snakes, self.foods)
+
+    def get_action_meanings(self, agent_i=None):
+        if agent_i is not None:
+            return [ACTION_MEANING[i] for i in range(self.action_space[agent_i].n)]
+        return [[ACTION_MEANING[i] for i in range(n)] for n in self.action_space.nvec]
+
+    # ############### #
+    # Private Methods #
+    # ############### #
+
+    def _check(self, snake_id):
+        """Handles walls, food and collisions for the snake's new head and returns its reward."""
+        snake = self.snakes[snake_id]
+        x, y = snake[0]
+
+        if x <= 0 or y <= 0 or x + self.unit_size >= self.width or y + self.unit_size >= self.height:
+            self.deaths[snake_id] = "WALL"
+            return self._death_reward
+
+        if snake[0] == self.foods[snake_id]:
+            self.score += 1
+            self.foods[snake_id] = self._place_food()
+            return self._food_reward
+
+        for other_id, other in enumerate(self.snakes):
+            blocks = other[1:] if other_id == snake_id else other
+            if snake[0] in blocks:
+                self.deaths[snake_id] = "SELF" if other_id == snake_id else "SNAKE"
+                return self._death_reward
+
+        return self._step_reward
+
+    def _place_food(self):
+        x = self.np_random.integers(2, self.width // self.unit_size - 1) * self.unit_size
+        y = self.np_random.integers(2, self.height // self.unit_size - 1) * self.unit_size
+        return [int(x), int(y)]
+
+    def _observation(self):
+        heads = [snake[0] for snake in self.snakes]
+        return np.array(heads + self.foods, dtype=np.int64).reshape(-1)
+
+    def _info(self):
+        return {"steps": self.steps, "score": self.score, "deaths": list(self.deaths)}
+
+
+def make_vector_env(num_envs, asynchronous=False, **kwargs):
+    """
+    Creates `num_envs` copies of the registered SnakeEnv as a gym vector environment, stepped in
+    lockstep in this process (SyncVectorEnv) or in one subprocess each (AsyncVectorEnv).
+    Keyword arguments are passed on to every SnakeEnv.
+    """
+    return gym.vector.make(ENV_ID, num_envs=num_envs, asynchronous=asynchronous, **kwargs)
+
+
+if ENV_ID not in gym.envs.registry:
+    gym.register(id=ENV_ID, entry_point="snake_env:SnakeEnv")
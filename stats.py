@@ -0,0 +1,210 @@
+import math
+from collections import Counter
+
+import numpy as np
+
+DEATH_CAUSES = ["WALL", "SNAKE", "SELF", "MAX_STEPS"]
+
+
+class RunningStat:
+
+    """
+    Streaming mean and variance of a metric, updated one sample at a time with Welford's algorithm.
+
+    Uses constant memory whatever the number of samples, and two accumulators can be merged (e.g. the
+    ones filled by different worker processes) with the parallel formula of Chan et al.
+    The variance is the population variance, as computed by np.var/np.std.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def push(self, value):
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Adds the samples summarized by `other` to this accumulator and returns it."""
+        n = self.n + other.n
+        if n == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta ** 2 * self.n * other.n / n
+        self.n = n
+        return self
+
+    @property
+    def variance(self):
+        return self.m2 / self.n if self.n > 0 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def __repr__(self):
+        return f"RunningStat(n={self.n}, mean={self.mean:.4g}, std={self.std:.4g})"
+
+
+class TeamStats:
+
+    """
+    Streaming summary of the episodes played by a team.
+
+    Keeps a RunningStat for the steps, the score and the score efficiency (score/steps) of the episodes,
+    and a counter of their causes of death. The distinct values of each metric are also counted, for the
+    bootstrap confidence intervals: as episodes last at most MAX_STEPS steps, their number is bounded by
+    the game rules rather than by the number of episodes.
+    """
+
+    METRICS = ("steps", "score", "efficiency")
+
+    def __init__(self):
+        self.steps = RunningStat()
+        self.score = RunningStat()
+        self.efficiency = RunningStat()
+        self.deaths = Counter()
+        self.values = {metric: Counter() for metric in self.METRICS}
+
+    def push(self, result):
+        """Adds an episode result, given as [steps, score, death] (see Game.get_results)."""
+        steps, score, death = result
+        for metric, value in zip(self.METRICS, (steps, score, score / steps)):
+            getattr(self, metric).push(value)
+            self.values[metric][value] += 1
+        self.deaths[death] += 1
+
+    def merge(self, other):
+        for metric in self.METRICS:
+            getattr(self, metric).merge(getattr(other, metric))
+            self.values[metric].update(other.values[metric])
+        self.deaths.update(other.deaths)
+        return self
+
+    def bootstrap_ci(self, metric, confidence=0.95, n_resamples=10000, seed=None):
+        """Returns the (low, high) percentile bootstrap confidence interval of the mean of a metric."""
+        values, counts = zip(*self.values[metric].items())
+        return bootstrap_ci(values, confidence, n_resamples=n_resamples, seed=seed, counts=counts)
+
+    @property
+    def n(self):
+        return self.steps.n
+
+    def death_counts(self, death_causes=DEATH_CAUSES):
+        return [self.deaths[death] for death in death_causes]
+
+    def __repr__(self):
+        return f"TeamStats(steps={self.steps}, score={self.score}, efficiency={self.efficiency}, deaths={dict(self.deaths)})"
+
+
+def encode_deaths(deaths, death_causes=DEATH_CAUSES):
+    """Encodes a sequence of causes of death as an integer array of indices into `death_causes`."""
+    causes, inverse = np.unique(np.asarray(deaths, dtype=str), return_inverse=True)
+    codes = np.array([death_causes.index(cause) for cause in causes.tolist()], dtype=np.int64)
+    return codes[inverse].reshape(-1)
+
+
+def count_deaths(deaths, death_causes=DEATH_CAUSES):
+    """Counts the occurrences of each cause of death, in the order of `death_causes`."""
+    return np.bincount(encode_deaths(deaths, death_causes), minlength=len(death_causes))
+
+
+def bootstrap(samples, statistic=np.mean, n_resamples=10000, seed=None, block_size=2 ** 24, counts=None, n_bins=1024):
+    """
+    Computes the bootstrap distribution of a statistic of the samples.
+
+    Resamples are drawn as a (resamples x N) matrix of indices and the statistic is applied along its rows,
+    in blocks of about `block_size` indices to bound memory. The mean has two faster paths:
+
+    * For a discrete metric (e.g. steps or score, with at most `n_bins` distinct values), a resample is fully
+      described by how many times it draws each value, so the counts are drawn from a multinomial instead,
+      in O(resamples x K) for K distinct values.
+    * For a continuous metric (e.g. efficiency) too large for a single block, the sorted samples are split
+      into `n_bins` bins of equal counts and the multinomial draws bins. The sum of the d samples drawn
+      from a bin of mean m and variance v is then taken as d * m plus a normal term of variance d * v,
+      which keeps the mean and variance of every resample exact and costs O(resamples x n_bins).
+
+    Parameters
+    ----------
+    samples: Sequence[float]
+        The observed values of the metric (or its distinct values, if `counts` is given).
+    statistic: Callable
+        Reduces an array of resamples along axis 1 (e.g. np.mean or np.median).
+    n_resamples: int
+        The number of bootstrap resamples.
+    seed: Optional[int]
+        Seeds the resampling.
+    block_size: int
+        Largest number of indices drawn at once.
+    counts: Optional[Sequence[int]]
+        The number of occurrences of each of the samples (e.g. TeamStats.values).
+    n_bins: int
+        Largest number of distinct values (or bins) drawn by the multinomial paths of the mean.
+
+    Returns
+    -------
+        The (n_resamples,) array of the statistic of each resample.
+    """
+    rng = np.random.default_rng(seed)
+    if counts is None:
+        samples = np.asarray(samples, dtype=np.float64)
+        n = len(samples)
+    else:
+        counts = np.asarray(counts, dtype=np.int64)
+        n = int(counts.sum())
+
+    if statistic is np.mean:
+        # The distinct values sorted, with their counts (kept apart from `counts`, which pairs with `samples`)
+        if counts is None:
+            values, value_counts = np.unique(samples, return_counts=True)
+        else:
+            values, value_counts = _sorted_counts(samples, counts)
+        if len(values) <= n_bins:
+            draws = rng.multinomial(n, value_counts / n, size=n_resamples)
+            return draws @ values / n
+        if n * n_resamples > block_size:
+            # Equal-count bins of the sorted values (a value is never split across bins)
+            _, bins = np.unique((np.cumsum(value_counts) - value_counts) * n_bins // n, return_inverse=True)
+            bin_counts = np.bincount(bins, weights=value_counts)
+            means = np.bincount(bins, weights=value_counts * values) / bin_counts
+            variances = np.maximum(
+                np.bincount(bins, weights=value_counts * values ** 2) / bin_counts - means ** 2, 0.0)
+            draws = rng.multinomial(n, bin_counts / n, size=n_resamples)
+            return (draws @ means + rng.standard_normal(n_resamples) * np.sqrt(draws @ variances)) / n
+
+    if counts is not None:
+        samples = np.repeat(np.asarray(samples, dtype=np.float64), counts)
+    rows = max(1, block_size // n)
+    distribution = np.empty(n_resamples)
+    for start in range(0, n_resamples, rows):
+        stop = min(start + rows, n_resamples)
+        indices = rng.integers(0, n, size=(stop - start, n))
+        distribution[start:stop] = statistic(samples[indices], axis=1)
+    return distribution
+
+
+def _sorted_counts(values, counts):
+    """Sorts distinct values and their counts by value."""
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(values)
+    return values[order], counts[order]
+
+
+def bootstrap_ci(samples, confidence=0.95, statistic=np.mean, n_resamples=10000, seed=None, counts=None):
+    """
+    Computes a percentile bootstrap confidence interval of a statistic, at any confidence level and without
+    assuming the metric is normally distributed. The samples may be given as distinct values and their
+    `counts` (see bootstrap).
+
+    Returns
+    -------
+        The (low, high) bounds of the confidence interval.
+    """
+    distribution = bootstrap(samples, statistic, n_resamples, seed, counts=counts)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(distribution, [alpha, 1 - alpha])
+    return float(low), float(high)
@@ -0,0 +1,323 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from stats import DEATH_CAUSES, TeamStats
+
+HEURISTIC_AGENTS = ("random", "fully_greedy", "part_greedy", "social_convention", "intention_comm")
+LEARNERS = ("centralized", "independent", "vdn")
+HYPERPARAMETERS = ("learning_rate", "discount_factor", "exploration_rate", "initial_q_values")
+GRID_KEYS = ("agents", "board_size", "snake_size", "max_steps") + HYPERPARAMETERS
+
+DEFAULTS = {
+    "name": "sweep",
+    "episodes": 30,
+    "training_episodes": 100,
+    "seed": 0,
+    "unit_size": 20,
+    "grid": {},
+}
+DEFAULT_GRID = {
+    "agents": list(HEURISTIC_AGENTS),
+    "board_size": [600],
+    "snake_size": [7],
+    "max_steps": [500],
+}
+
+# Side of the grid IntentionCommunicationAgent plans its paths on, in cells
+INTENTION_GRID_CELLS = 60
+
+# Relative cost of a step of each agent type, to order the jobs (measured on the default board)
+STEP_COSTS = {
+    "random": 1,
+    "fully_greedy": 1,
+    "part_greedy": 1,
+    "social_convention": 3,
+    "intention_comm": 20,
+    "centralized": 4,
+    "independent": 4,
+    "vdn": 4,
+}
+
+
+def load_config(path):
+    """
+    Reads an experiment config (JSON) and fills in the defaults.
+
+    The config gives the name of the experiment, the number of `episodes` played by every job (after
+    `training_episodes` for learners), the `seed` of the first episode, the `unit_size` of the board, and a
+    `grid` of lists of values for each of GRID_KEYS. Agents are the heuristic teams of snake-game.py or the
+    multi-agent learners of snake-game-rl.py; the learner hyperparameters only apply to the latter. The
+    heuristic agents move in steps of agents.UNIT_SIZE, so they require that unit size, and the intention
+    agent plans on a grid of INTENTION_GRID_CELLS cells per side, which bounds its board size.
+    """
+    from agents import UNIT_SIZE
+
+    with open(path) as file:
+        config = json.load(file)
+
+    unknown = set(config) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown config keys {sorted(unknown)}, expected some of {sorted(DEFAULTS)}")
+    config = {**DEFAULTS, **config}
+    config["grid"] = {**DEFAULT_GRID, **config["grid"]}
+
+    unknown = set(config["grid"]) - set(GRID_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown grid keys {sorted(unknown)}, expected some of {GRID_KEYS}")
+    for key, values in config["grid"].items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"The grid values of {key} must be a non-empty list")
+    for agent in config["grid"]["agents"]:
+        if agent not in HEURISTIC_AGENTS + LEARNERS:
+            raise ValueError(f"Unknown agent type {agent}, expected one of {HEURISTIC_AGENTS + LEARNERS}")
+    for board_size in config["grid"]["board_size"]:
+        if board_size % config["unit_size"]:
+            raise ValueError(f"The board size {board_size} must be a multiple of the unit size {config['unit_size']}")
+    heuristic_agents = set(config["grid"]["agents"]) & set(HEURISTIC_AGENTS) - {"random"}
+    if heuristic_agents and config["unit_size"] != UNIT_SIZE:
+        raise ValueError(f"The agents {sorted(heuristic_agents)} require a unit size of {UNIT_SIZE}")
+    if "intention_comm" in config["grid"]["agents"]:
+        largest_board = INTENTION_GRID_CELLS * config["unit_size"]
+        for board_size in config["grid"]["board_size"]:
+            if board_size > largest_board:
+                raise ValueError(f"The board size {board_size} of intention_comm must be at most {largest_board}")
+    return config
+
+
+def expand_jobs(config):
+    """
+    Expands the grid of a config into a list of jobs (dicts), one per combination of values. Combinations that
+    only differ by learner hyperparameters are played once for heuristic agents.
+    """
+    grid = config["grid"]
+    hyperparameters = [key for key in HYPERPARAMETERS if key in grid]
+
+    jobs = []
+    seen = set()
+    for agents, board_size, snake_size, max_steps, *values in itertools.product(
+            *(grid[key] for key in ("agents", "board_size", "snake_size", "max_steps")),
+            *(grid[key] for key in hyperparameters)):
+        job_hyperparameters = dict(zip(hyperparameters, values)) if agents in LEARNERS else {}
+        name = " ".join([agents, f"board={board_size}", f"snake={snake_size}", f"max_steps={max_steps}"]
+                        + [f"{key}={value}" for key, value in job_hyperparameters.items()])
+        if name in seen:
+            continue
+        seen.add(name)
+        jobs.append({
+            "name": name,
+            "agents": agents,
+            "board_size": board_size,
+            "snake_size": snake_size,
+            "max_steps": max_steps,
+            "hyperparameters": job_hyperparameters,
+            "unit_size": config["unit_size"],
+            "episodes": config["episodes"],
+            "training_episodes": config["training_episodes"] if agents in LEARNERS else 0,
+            "seed": config["seed"],
+        })
+    return jobs
+
+
+def expected_cost(job):
+    """Estimates the relative duration of a job, as its number of steps (at most) times the cost of a step."""
+    return (job["episodes"] + job["training_episodes"]) * job["max_steps"] * STEP_COSTS[job["agents"]]
+
+
+def schedule(jobs):
+    """Orders jobs longest first, so that the longest ones do not start last and leave the other workers idle."""
+    return sorted(jobs, key=expected_cost, reverse=True)
+
+
+def run_job(job):
+    """
+    Plays the episodes of a job on a headless SnakeEnv, after training the learner if the job has one.
+
+    Evaluation episode i is played with seed `seed + i` whatever the job, so all jobs face the same food
+    placements. SnakeEnv is not the Game of snake-game.py: the snakes start one unit further down and
+    right, the food is drawn from another generator and a snake that dies no longer eats, so the results
+    of a sweep are only comparable with those of other sweeps. Returns the job and the (seed, episode,
+    [steps, score, death], duration) of every episode.
+    """
+    from snake_env import SnakeEnv
+
+    environment = SnakeEnv(job["board_size"], job["board_size"], job["unit_size"],
+                           snake_size=job["snake_size"], max_steps=job["max_steps"])
+
+    if job["agents"] in LEARNERS:
+        from encoders import RelativeFeatureEncoder
+
+        encoder = RelativeFeatureEncoder(job["board_size"], job["board_size"], job["unit_size"])
+        learner = create_learner(job["agents"], encoder.n_states, job["hyperparameters"])
+        learner.train()
+        for episode in range(job["training_episodes"]):
+            play_learner_episode(environment, learner, encoder, job["seed"] + job["episodes"] + episode)
+        learner.eval()
+        play_episode = lambda seed: play_learner_episode(environment, learner, encoder, seed)
+    else:
+        play_episode = lambda seed: play_heuristic_episode(environment, job["agents"], seed)
+
+    episodes = []
+    for episode in range(job["episodes"]):
+        seed = job["seed"] + episode
+        start = time.perf_counter()
+        result = play_episode(seed)
+        episodes.append((seed, episode, result, time.perf_counter() - start))
+    return job, episodes
+
+
+def create_learner(learner_type, n_states, hyperparameters):
+    from agents import FactorizedQLearning, QLearning
+
+    action_counts = [4, 4]
+    if learner_type == "centralized":
+        return QLearning(int(np.prod(action_counts)), n_states=n_states, **hyperparameters)
+    return FactorizedQLearning(action_counts, learner_type, n_states=n_states, **hyperparameters)
+
+
+def create_heuristic_team(agent_type):
+    # Same agents as the snakes of snake-game.py, though they play on SnakeEnv (see run_job)
+    from agents import (FullyGreedyAgent, IntentionCommunicationAgent, PartiallyGreedyAgent, RandomAgent,
+                        SocialConventionAgent)
+
+    agent_classes = {
+        "fully_greedy": FullyGreedyAgent,
+        "part_greedy": PartiallyGreedyAgent,
+        "social_convention": SocialConventionAgent,
+        "intention_comm": IntentionCommunicationAgent,
+    }
+    if agent_type == "random":
+        return [RandomAgent(), RandomAgent()]
+    return [agent_classes[agent_type](agent_id, False) for agent_id in (1, 2)]
+
+
+def play_heuristic_episode(environment, agent_type, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    agents = create_heuristic_team(agent_type)
+    environment.reset(seed=seed)
+
+    terminal = False
+    while not terminal:
+        # The agents observe the game as in snake-game.py: ([snakes_positions, food_positions], rewards, done)
+        observation = ([[list(block) for block in snake] for snake in environment.snakes],
+                       [list(food) for food in environment.foods]), [0, 0], False
+        for agent in agents:
+            agent.see(observation)
+        if agent_type == "intention_comm":
+            if len(agents[0].intention) == 0:
+                agents[1].receive_intention(agents[0].make_new_intention())
+                agents[1].make_new_intention()
+            if len(agents[1].intention) == 0:
+                agents[1].make_new_intention()
+        _, _, terminated, truncated, _ = environment.step([agent.action() for agent in agents])
+        terminal = terminated or truncated
+    return episode_result(environment)
+
+
+def play_learner_episode(environment, learner, encoder, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    environment.reset(seed=seed)
+    observation = encoder([environment.snakes, environment.foods])
+
+    terminal = False
+    while not terminal:
+        learner.see(observation)
+        action = learner.action()
+        _, reward, terminated, truncated, info = environment.step(np.unravel_index(action, (4, 4)))
+        terminal = terminated or truncated
+        next_observation = encoder([environment.snakes, environment.foods])
+        if learner.training:
+            learner.next(observation, action, next_observation, reward, terminal, info)
+        observation = next_observation
+    return episode_result(environment)
+
+
+def episode_result(environment):
+    """Returns [steps, score, death] as Game.get_results, the death of the first snake coming first."""
+    deaths = [death for death in environment.deaths if death is not None]
+    return [environment.steps, environment.score, deaths[0] if deaths else "MAX_STEPS"]
+
+
+def run_sweep(config, results_dir, n_workers=1):
+    """
+    Runs every job of a config over a pool of `n_workers` processes, longest jobs first.
+
+    The results directory receives a copy of the config, every episode in an SQLite ResultsStore (episodes.db,
+    with the experiment name and start time as run id and the job name as team) and one summary row per job
+    (summary.csv). Running the same experiment again adds a new run to episodes.db rather than mixing its
+    episodes with the previous ones. Returns the TeamStats of every job, by job name.
+    """
+    from results import ResultsStore
+
+    output_dir = os.path.join(results_dir, config["name"])
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "config.json"), "w") as file:
+        json.dump(config, file, indent=2)
+
+    jobs = schedule(expand_jobs(config))
+    print(f"{len(jobs)} jobs, {n_workers} workers")
+    job_stats = {}
+    durations = {}
+    run_id = f"{config['name']}-{time.strftime('%Y%m%d-%H%M%S')}"
+    with ResultsStore(os.path.join(output_dir, "episodes.db"), run_id=run_id) as store:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            # The pool hands out jobs in submission order, hence longest first
+            futures = [executor.submit(run_job, job) for job in jobs]
+            for done, future in enumerate(as_completed(futures), start=1):
+                job, episodes = future.result()
+                stats = job_stats[job["name"]] = TeamStats()
+                for seed, episode, result, duration in episodes:
+                    stats.push(result)
+                    store.add(job["name"], [job["agents"], job["agents"]], seed, episode, result, duration)
+                durations[job["name"]] = sum(episode[3] for episode in episodes)
+                print(f"[{done}/{len(jobs)}] {job['name']}: score {stats.score.mean:.2f}, "
+                      f"steps {stats.steps.mean:.1f} ({durations[job['name']]:.1f} s)")
+
+    write_summary(os.path.join(output_dir, "summary.csv"), jobs, job_stats, durations)
+    return job_stats
+
+
+def write_summary(filename, jobs, job_stats, durations):
+    hyperparameters = [key for key in HYPERPARAMETERS if any(key in job["hyperparameters"] for job in jobs)]
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(
+            ["job", "agents", "board_size", "snake_size", "max_steps"] + hyperparameters + ["episodes"]
+            + [f"{metric}_{value}" for metric in TeamStats.METRICS for value in ("mean", "std")]
+            + [f"deaths_{death}" for death in DEATH_CAUSES] + ["duration"])
+        for job in sorted(jobs, key=lambda job: job["name"]):
+            stats = job_stats[job["name"]]
+            writer.writerow(
+                [job["name"], job["agents"], job["board_size"], job["snake_size"], job["max_steps"]]
+                + [job["hyperparameters"].get(key, "") for key in hyperparameters] + [stats.n]
+                + [value for metric in TeamStats.METRICS
+                   for value in (getattr(stats, metric).mean, getattr(stats, metric).std)]
+                + stats.death_counts(DEATH_CAUSES) + [round(durations[job["name"]], 3)])
+
+
+def main():
+    # Runs the experiment described by a config file, e.g. python sweep.py experiment.json --workers 8
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--results-dir", default="results")
+    opt = parser.parse_args()
+
+    config = load_config(opt.config)
+    start = time.perf_counter()
+    run_sweep(config, opt.results_dir, opt.workers)
+    print(f"Wrote the results of {config['name']} to {os.path.join(opt.results_dir, config['name'])} "
+          f"in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qtable import QTable
+
+
+def test_checkpoint_is_a_point_in_time_copy(tmp_path):
+    table = QTable(4)
+    table[(1, 1)][:] = [1, 2, 3, 4]
+    table.checkpoint(str(tmp_path), {"evaluations_done": 1})
+
+    # Updates and insertions after the checkpoint never reach it
+    table[(1, 1)][:] = 9
+    table[(2, 2)][:] = [0, 42, 0, 0]
+
+    resumed = QTable.load(str(tmp_path))
+    assert resumed.n_rows == 1
+    assert resumed.meta["evaluations_done"] == 1
+    np.testing.assert_array_equal(resumed[(1, 1)], [1, 2, 3, 4])
+    np.testing.assert_array_equal(resumed[(2, 2)], [0, 0, 0, 0])
+
+    # Nor do the updates of the resumed table, until it is checkpointed
+    resumed[(1, 1)][0] = 100
+    np.testing.assert_array_equal(QTable.load(str(tmp_path))[(1, 1)], [1, 2, 3, 4])
+
+
+def test_empty_table_can_grow_after_resume(tmp_path):
+    QTable(3).checkpoint(str(tmp_path))
+    resumed = QTable.load(str(tmp_path))
+    for state in range(10):
+        resumed.row((state,))
+    assert len(resumed) == 10
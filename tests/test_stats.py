@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stats import TeamStats, bootstrap, bootstrap_ci
+
+
+def test_bootstrap_mean_of_many_distinct_values_falls_back_to_resampling():
+    # More distinct values than bins (and some repeated ones), but small enough for a single block of indices
+    samples = np.round(np.random.default_rng(0).random(3000), 4)
+    assert 1024 < len(np.unique(samples)) < len(samples)
+    distribution = bootstrap(samples, n_resamples=100, seed=0, n_bins=1024)
+    assert distribution.shape == (100,)
+    assert abs(distribution.mean() - samples.mean()) < 0.01
+
+
+def test_bootstrap_pairs_unsorted_values_with_their_counts():
+    # The mean of 10 x 3, 1 x 1 and 1 x 2 is 2.75, whichever path draws the resamples
+    for n_bins in (1, 1024):
+        distribution = bootstrap([3, 1, 2], counts=[10, 1, 1], n_resamples=2000, seed=0, n_bins=n_bins)
+        assert abs(distribution.mean() - 2.75) < 0.02
+
+
+def test_team_stats_bootstrap_ci_contains_the_mean():
+    stats = TeamStats()
+    for steps, score in [(100, 3), (20, 0), (500, 12), (73, 2), (250, 7)]:
+        stats.push([steps, score, "WALL"])
+    for metric in TeamStats.METRICS:
+        low, high = stats.bootstrap_ci(metric, seed=0)
+        assert low <= getattr(stats, metric).mean <= high
+
+
+def test_bootstrap_ci_is_reproducible_with_a_seed():
+    samples = np.random.default_rng(1).gamma(2, 1, 500)
+    assert bootstrap_ci(samples, seed=3) == bootstrap_ci(samples, seed=3)
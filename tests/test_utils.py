@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import EarlyStopping
+
+
+def test_early_stopping_ignores_improvements_within_min_delta():
+    early_stopping = EarlyStopping("max", patience=3, min_delta=1.0)
+    assert early_stopping.update(0, [10.0])
+    # Each step is below min_delta, so the best mean stays at 10 and patience runs out
+    assert not early_stopping.update(1, [10.5])
+    assert not early_stopping.update(2, [10.9])
+    assert not early_stopping.update(3, [10.95])
+    assert early_stopping.best_mean == 10.0
+    assert early_stopping.best_evaluation == 0
+    assert early_stopping.should_stop
+
+
+def test_early_stopping_state_round_trips():
+    early_stopping = EarlyStopping("min", patience=2)
+    early_stopping.update(0, [5.0, 7.0])
+    early_stopping.update(1, [8.0])
+    resumed = EarlyStopping("min", patience=2)
+    resumed.restore(early_stopping.state())
+    assert resumed.state() == early_stopping.state()
+    assert not resumed.update(2, [9.0])
+    assert resumed.should_stop
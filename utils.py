@@ -1,12 +1,15 @@
 import math
+import sys
+from statistics import NormalDist
 from typing import Optional, Sequence
 
 import numpy as np
-import matplotlib.pyplot as plt
+
+from stats import encode_deaths
 
 
 def z_table(confidence):
-    """Hand-coded Z-Table
+    """Hand-coded Z-Table, falling back to the inverse normal CDF for other confidence levels
 
     Parameters
     ----------
@@ -17,11 +20,14 @@ def z_table(confidence):
     -------
         The z-value for the confidence level given.
     """
-    return {
+    z_values = {
         0.99: 2.576,
         0.95: 1.96,
         0.90: 1.645
-    }[confidence]
+    }
+    if confidence in z_values:
+        return z_values[confidence]
+    return NormalDist().inv_cdf((1 + confidence) / 2)
 
 
 def confidence_interval(mean, n, confidence):
@@ -62,6 +68,145 @@ def standard_error(std_dev, n, confidence):
     return z_table(confidence) * (std_dev / math.sqrt(n))
 
 
+class EarlyStopping:
+    """Stops a train-eval loop once the evaluation metric has converged.
+
+    After every evaluation the mean of the results is compared with the best mean so far. The loop should
+    stop once `patience` evaluations in a row failed to improve on it by more than `min_delta`.
+    While waiting, the evaluation budget is shrunk to the number of episodes whose confidence interval
+    is about `min_delta` wide, since smaller differences would not count as improvements anyway.
+
+    Parameters
+    ----------
+    mode: str
+        "max" if higher values of the metric are better, "min" if lower values are. There is no default, as it
+        depends on the metric (e.g. more steps is better when surviving, worse when chasing food).
+    patience: int
+        Number of evaluations without improvement before stopping.
+    min_delta: float
+        Smallest change of the mean that counts as an improvement.
+    confidence: float
+        The confidence level for the confidence interval.
+    min_eval_episodes: int
+        Lower bound for the shrunk evaluation budget.
+    """
+
+    MODES = ("max", "min")
+
+    def __init__(self, mode, patience=3, min_delta=0.0, confidence=0.95, min_eval_episodes=8):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode {mode}, expected one of {self.MODES}")
+        self.patience = patience
+        self.min_delta = min_delta
+        self.confidence = confidence
+        self.sign = 1 if mode == "max" else -1
+        self.min_eval_episodes = min_eval_episodes
+        self.best_mean = None
+        self.best_evaluation = None
+        self.evaluations_without_improvement = 0
+        self.interval = None
+        self.n_results = None
+
+    @property
+    def should_stop(self):
+        return self.evaluations_without_improvement >= self.patience
+
+    def update(self, evaluation, results):
+        """Records the results of an evaluation. Returns True if they are the best so far."""
+        mean = np.mean(results)
+        self.interval = standard_error(np.std(results), len(results), self.confidence)
+        self.n_results = len(results)
+
+        # Smaller improvements leave the best mean where it is, so that it cannot creep up below min_delta
+        if self.best_mean is None or self.sign * (mean - self.best_mean) > self.min_delta:
+            self.evaluations_without_improvement = 0
+            self.best_mean = mean
+            self.best_evaluation = evaluation
+            return True
+
+        self.evaluations_without_improvement += 1
+        return False
+
+    def state(self):
+        """Returns the progress of the early stopping as a JSON-serializable dict, e.g. to store in a checkpoint."""
+        return {
+            "best_mean": None if self.best_mean is None else float(self.best_mean),
+            "best_evaluation": self.best_evaluation,
+            "evaluations_without_improvement": self.evaluations_without_improvement,
+            "interval": None if self.interval is None else float(self.interval),
+            "n_results": self.n_results,
+        }
+
+    def restore(self, state):
+        """Resumes from the progress returned by `state`."""
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def eval_episodes(self, n_eval_episodes):
+        """Returns the evaluation budget for the next evaluation, at most `n_eval_episodes`."""
+        if self.evaluations_without_improvement == 0 or self.min_delta <= 0 or self.interval is None:
+            return n_eval_episodes
+        # The interval shrinks with the square root of the number of episodes
+        needed = math.ceil(self.n_results * (self.interval / self.min_delta) ** 2)
+        return int(min(n_eval_episodes, max(self.min_eval_episodes, needed)))
+
+
+class AdaptiveBudget:
+    """Decides which teams need more episodes to tell their ranking on a metric apart.
+
+    Each team's mean comes with a confidence interval (see standard_error). A team is unresolved while its
+    interval overlaps the interval of any other team: more episodes narrow the interval and may separate
+    them. Resolved teams get no more episodes, so the budget is spent on the close comparisons only.
+    The intervals are re-tested after every batch, so the confidence level is nominal rather than exact.
+
+    Parameters
+    ----------
+    metric: str
+        The TeamStats metric that ranks the teams ("steps", "score" or "efficiency").
+    confidence: float
+        The confidence level for the confidence intervals.
+    max_episodes: int
+        Largest number of episodes played by any team.
+    batch_size: int
+        Number of episodes added to each unresolved team between two tests.
+    """
+
+    METRICS = ("steps", "score", "efficiency")
+
+    def __init__(self, metric="score", confidence=0.95, max_episodes=200, batch_size=5):
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric {metric}, expected one of {self.METRICS}")
+        self.metric = metric
+        self.confidence = confidence
+        self.max_episodes = max_episodes
+        self.batch_size = batch_size
+
+    def intervals(self, stats):
+        """Returns the (low, high) confidence interval of the mean of each RunningStat."""
+        intervals = []
+        for stat in stats:
+            error = standard_error(stat.std, stat.n, self.confidence)
+            intervals.append((stat.mean - error, stat.mean + error))
+        return intervals
+
+    def unresolved(self, stats):
+        """Returns the indices of the teams whose interval overlaps the interval of another team."""
+        intervals = self.intervals(stats)
+        return [
+            i for i, (low, high) in enumerate(intervals)
+            if any(j != i and low <= other_high and other_low <= high for j, (other_low, other_high) in enumerate(intervals))
+        ]
+
+    def next_episodes(self, team_stats):
+        """Maps each team index to the number of episodes it should play next. Empty once the ranking is
+        resolved or every unresolved team has reached `max_episodes`."""
+        stats = [getattr(team, self.metric) for team in team_stats]
+        return {
+            i: min(self.batch_size, self.max_episodes - stats[i].n)
+            for i in self.unresolved(stats) if stats[i].n < self.max_episodes
+        }
+
+
 def plot_confidence_bar(names, means, std_devs, N, title, x_label, y_label, confidence, show=False, filename=None, colors=None, yscale=None):
     """Creates a bar plot for comparing different agents/teams.
 
@@ -94,6 +239,8 @@ def plot_confidence_bar(names, means, std_devs, N, title, x_label, y_label, conf
         The scale for the y-axis (default: linear)
     """
 
+    import matplotlib.pyplot as plt
+
     errors = [standard_error(std_devs[i], N[i], confidence) for i in range(len(means))]
     fig, ax = plt.subplots()
     x_pos = np.arange(len(names))
@@ -114,7 +261,7 @@ def plot_confidence_bar(names, means, std_devs, N, title, x_label, y_label, conf
     plt.close()
 
 
-def compare_results(results, confidence=0.95, title="Agents Comparison", metric="Steps Per Episode", colors=None):
+def compare_results(results, confidence=0.95, title="Agents Comparison", metric="Steps Per Episode", colors=None, show=True, filename=None):
 
     """Displays a bar plot comparing the performance of different agents/teams.
 
@@ -131,6 +278,10 @@ def compare_results(results, confidence=0.95, title="Agents Comparison", metric=
             The name of the metric for comparison
         colors: Sequence[str]
             A sequence of colors (one for each agent/team)
+        show: bool
+            Whether to show the plot (blocks until its window is closed)
+        filename: str
+            If given, saves the plot to a file
 
         """
 
@@ -146,22 +297,63 @@ def compare_results(results, confidence=0.95, title="Agents Comparison", metric=
         N=N,
         title=title,
         x_label="", y_label=f"Avg. {metric}",
-        confidence=confidence, show=True, colors=colors
+        confidence=confidence, show=show, filename=filename, colors=colors
     )
 
 def count_deaths(results, death_causes):
     death_counts = np.zeros((len(results), len(death_causes)))
     for i in range(len(results)):
-        for death in results[i]:
-            death_counts[i][death_causes.index(death)]+=1    
+        death_counts[i] = np.bincount(encode_deaths(results[i], death_causes), minlength=len(death_causes))
     return death_counts
 
-def plot_deaths(results, colors):
+def compare_stats(stats, confidence=0.95, title="Agents Comparison", metric="Steps Per Episode", colors=None, show=True, filename=None):
+
+    """Displays the same bar plot as compare_results from streaming statistics.
+
+        Parameters
+        ----------
+
+        stats: Sequence[RunningStat]
+            The running statistics of the metric (one for each team, see stats.py)
+        confidence: float
+            The confidence level for the confidence interval
+        title: str
+            The title of the plot
+        metric: str
+            The name of the metric for comparison
+        colors: Sequence[str]
+            A sequence of colors (one for each agent/team)
+        show: bool
+            Whether to show the plot (blocks until its window is closed)
+        filename: str
+            If given, saves the plot to a file
+
+        """
+
+    names = ["Random", "Fully Greedy", "Partially Greedy", "Social Convention", "Intention Comm"]
+
+    plot_confidence_bar(
+        names=names,
+        means=[stat.mean for stat in stats],
+        std_devs=[stat.std for stat in stats],
+        N=[stat.n for stat in stats],
+        title=title,
+        x_label="", y_label=f"Avg. {metric}",
+        confidence=confidence, show=show, filename=filename, colors=colors
+    )
+
+def plot_deaths(results, colors, show=True, filename=None):
+    deaths = ["WALL", "SNAKE", "SELF", "MAX_STEPS"]
+    plot_death_counts(count_deaths(results, deaths), colors, show=show, filename=filename)
+
+def plot_death_counts(values, colors, show=True, filename=None):
+    """Plots the causes of loss of each team from a (teams x death causes) array of counts,
+    showing the figure and/or saving it to `filename`."""
+    import matplotlib.pyplot as plt
+
     names = ["Random", "Fully Greedy", "Partially Greedy", "Social Convention", "Intention Comm"]
     teams = len(names)
     deaths = ["WALL", "SNAKE", "SELF", "MAX_STEPS"]
-    
-    values = count_deaths(results, deaths)
 
     plt.figure(figsize=(16, 10))
     for team in range(teams):
@@ -173,6 +365,58 @@ def plot_deaths(results, colors):
         plt.bar(deaths, values[team], color=colors[team])
 
     plt.suptitle("Causes of Loss")
-    plt.show()
+    if filename is not None:
+        plt.savefig(filename)
+    if show:
+        plt.show()
+    plt.close()
+
+
+HEAVY_MODULES = ("numpy", "tkinter", "matplotlib", "scipy", "tqdm", "gym", "ma_gym")
+
+# Duration of the first import of each heavy module, recorded once time_imports was called
+_import_times = {}
+
+
+def time_imports():
+    """Starts timing the first import of each of the HEAVY_MODULES (including the modules it imports).
+
+    The timing wraps the import statement itself, so it covers the imports deferred into functions, in this
+    process and in the processes it forks later. Modules imported before the call are reported untimed.
+    """
+    import builtins
+    import time
 
+    original_import = builtins.__import__
 
+    def timed_import(name, *args, **kwargs):
+        module = name.split(".")[0]
+        if module not in HEAVY_MODULES or module in sys.modules:
+            return original_import(name, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return original_import(name, *args, **kwargs)
+        finally:
+            _import_times.setdefault(module, time.perf_counter() - start)
+
+    builtins.__import__ = timed_import
+
+
+def report_imports(process_name="main"):
+    """Prints which heavy dependencies are loaded in the current process, and how long their import took
+    (see time_imports).
+
+    Parameters
+    ----------
+    process_name: str
+        Name of the process in the report (e.g. "main" or "worker 3").
+    """
+    loaded = sorted(name.split(".")[0] for name in sys.modules)
+    print(f"[imports] {process_name}: {len(sys.modules)} modules loaded")
+    for module in HEAVY_MODULES:
+        n_submodules = loaded.count(module)
+        status = f"loaded ({n_submodules} modules)" if n_submodules > 0 else "not loaded"
+        if n_submodules > 0:
+            duration = _import_times.get(module)
+            status += f" in {duration * 1000:.0f} ms" if duration is not None else ", before the timing started"
+        print(f"[imports]     {module}: {status}")
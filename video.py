@@ -0,0 +1,165 @@
+import os
+import queue
+import re
+import shutil
+import subprocess
+import threading
+
+from render import BoardRasterizer
+
+FORMATS = ("gif", "mp4")
+
+
+def write_video(frames, filename, fps):
+    """
+    Encodes a sequence of RGB frames (each a height x width x 3 uint8 array) to a GIF, with Pillow, or to an
+    MP4, by piping the raw frames to ffmpeg. Frames are consumed one at a time, so they may share a buffer.
+    """
+    if filename.endswith(".gif"):
+        from PIL import Image
+
+        # The boards only use a handful of colors, so palette images keep the GIF (and its frames in memory) small
+        images = [Image.fromarray(frame).convert("P", palette=Image.ADAPTIVE, colors=8) for frame in frames]
+        images[0].save(filename, save_all=True, append_images=images[1:], duration=round(1000 / fps), loop=0)
+        return
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("MP4 export needs ffmpeg on the PATH")
+    encoder = None
+    try:
+        for frame in frames:
+            if encoder is None:
+                height, width, _ = frame.shape
+                encoder = subprocess.Popen([
+                    ffmpeg, "-loglevel", "error", "-y",
+                    "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+                    "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p", "-vcodec", "libx264", filename,
+                ], stdin=subprocess.PIPE)
+            encoder.stdin.write(frame.tobytes())
+    finally:
+        if encoder is not None:
+            encoder.stdin.close()
+            encoder.wait()
+
+
+class VideoExporter:
+
+    """
+    Exports selected episodes to videos from a background thread.
+
+    Games only record their states (the positions of the snakes and food at every step), which is cheap;
+    the selected episodes are handed to the encoder thread through a bounded queue, and the thread paints
+    the frames offscreen (see BoardRasterizer) and encodes them. Handing over never blocks the simulation:
+    if the encoder falls behind and the queue is full, the episode is dropped and counted in `dropped`.
+
+    Episodes are selected either every `every` episodes of each team, or, if `every` is 0, as the best and
+    the worst episode of each team (by score, then steps), exported when the team's episodes are over.
+    Files are named after the team and the episode, prefixed by `run_id` if set (e.g. to tell sweeps apart).
+
+    Parameters
+    ----------
+    output_dir: str
+        The directory the videos are written to.
+    board: tuple
+        (width, height, unit_size) of the board, in pixels.
+    video_format: str
+        "gif" or "mp4" (which needs ffmpeg).
+    fps: int
+        Frames (steps) per second of the videos.
+    every: int
+        Export every Nth episode of each team, or the best and worst ones if 0.
+    scale: float
+        Video pixels per board pixel.
+    max_queued: int
+        Largest number of episodes waiting for the encoder.
+    """
+
+    def __init__(self, output_dir, board, video_format="gif", fps=15, every=0, scale=0.5, max_queued=8):
+        if video_format not in FORMATS:
+            raise ValueError(f"Unknown video format {video_format}, expected one of {FORMATS}")
+        self.output_dir = output_dir
+        self.video_format = video_format
+        self.fps = fps
+        self.every = every
+        self.run_id = None
+        self.files = []
+        self.errors = []
+        self.dropped = 0
+        self._rasterizer = BoardRasterizer(*board, scale=scale)
+        self._candidates = {}
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = threading.Thread(target=self._encode, name="video-encoder", daemon=True)
+        os.makedirs(output_dir, exist_ok=True)
+        self._thread.start()
+
+    def offer(self, team, episode, result, states):
+        """
+        Proposes a finished episode for export.
+
+        Parameters
+        ----------
+        team: str
+            The name of the team.
+        episode: int
+            The index of the episode for the team.
+        result: list
+            [steps, score, death], as returned by Game.get_results.
+        states: list
+            The [snakes_positions, food_positions] of every step of the episode.
+        """
+        if self.every > 0:
+            if episode % self.every == 0:
+                self._submit(team, episode, "", states)
+            return
+
+        steps, score, _ = result
+        best, worst = self._candidates.get(team, (None, None))
+        key = (score, steps)
+        if best is None or key > best[0]:
+            best = (key, episode, states)
+        if worst is None or key < worst[0]:
+            worst = (key, episode, states)
+        self._candidates[team] = (best, worst)
+
+    def finish_team(self, team):
+        """Exports the best and worst episodes of a team once it played all of its episodes."""
+        best, worst = self._candidates.pop(team, (None, None))
+        if best is not None:
+            self._submit(team, best[1], "-best", best[2])
+        if worst is not None and worst[1] != best[1]:
+            self._submit(team, worst[1], "-worst", worst[2])
+
+    def close(self):
+        """Exports the remaining candidates, waits for the encoder and returns the files written."""
+        for team in list(self._candidates):
+            self.finish_team(team)
+        self._queue.put(None)
+        self._thread.join()
+        for error in self.errors:
+            print(f"[video] {error}")
+        if self.dropped:
+            print(f"[video] {self.dropped} episodes were dropped because the encoder fell behind")
+        return self.files
+
+    def _submit(self, team, episode, label, states):
+        name = re.sub(r"[^a-z0-9]+", "-", team.lower()).strip("-")
+        if self.run_id is not None:
+            name = f"{self.run_id}-{name}"
+        filename = os.path.join(self.output_dir, f"{name}-episode{episode + 1}{label}.{self.video_format}")
+        try:
+            self._queue.put_nowait((filename, states))
+        except queue.Full:
+            self.dropped += 1
+
+    def _encode(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            filename, states = job
+            try:
+                write_video((self._rasterizer.render(*state) for state in states), filename, self.fps)
+                self.files.append(filename)
+            except Exception as error:
+                self.errors.append(f"{filename}: {error}")